@@ -5,68 +5,50 @@
 Copyright © 2025 John Liu
 """
 
-import os
 from pathlib import Path
 
 import pillow_heif
 from loguru import logger as log
-from PIL import Image
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE, Conf
+from batch_img.const import Conf
 from batch_img.orientation import Orientation
+from batch_img.pipeline import AUTO_ROTATE, BORDER, REMOVE_GPS, RESIZE, Pipeline
 from batch_img.rotate import Rotate
 
 pillow_heif.register_heif_opener()
 
 
 class Auto:
+    STEPS = [
+        (RESIZE, (Conf.max_length,)),
+        (BORDER, (Conf.bd_width, Conf.bd_color)),
+        (REMOVE_GPS, ()),
+    ]
+
     @staticmethod
-    def process_an_image(in_path: Path, out_path: Path | str) -> tuple:
-        """Process an image file:
+    def process_an_image(
+        in_path: Path, out_path: Path | str, auto_rotate: bool = False
+    ) -> tuple:
+        """Process an image file, decode and write once:
         * Resize to 1920-pixel max length
+        * Auto-rotate the resized image in memory, if auto_rotate
         * Add 5-pixel width black color border
         * Remove GPS location info
 
         Args:
             in_path: input file path
             out_path: output dir path or REPLACE
+            auto_rotate: auto rotate image flag
 
         Returns:
             tuple: bool, str
         """
-        try:
-            with Image.open(in_path) as img:
-                width, height = img.size
-                log.debug(f"{width=}, {height=}")
-                new_size = Common.calculate_new_size(width, height, Conf.max_length)
-                new_img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3)
-
-                # Add border
-                width, height = new_img.size
-                log.debug(f"new_img: {width=}, {height=}")
-                box = Common.get_crop_box(width, height, Conf.bd_width)
-                cropped_img = new_img.crop(box)
-                bd_img = Image.new(new_img.mode, (width, height), Conf.bd_color)
-                bd_img.paste(cropped_img, (Conf.bd_width, Conf.bd_width))
-
-                file = Common.set_out_file(in_path, out_path, f"bw{Conf.bd_width}")
-
-                if EXIF not in img.info:
-                    log.debug(f"No EXIF in {in_path}")
-                    bd_img.save(file, img.format, optimize=True)
-                else:
-                    _, exif_bytes = Common.remove_exif_gps(img.info[EXIF])
-                    log.debug(f"Purge GPS in EXIF in {in_path}")
-                    bd_img.save(file, img.format, optimize=True, exif=exif_bytes)
-            log.debug(f"Saved the processed image to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
-            return True, file
-        except (AttributeError, FileNotFoundError, ValueError) as e:
-            return False, f"{in_path}:\n{e}"
+        steps = Auto.STEPS
+        if auto_rotate:
+            steps = [steps[0], (AUTO_ROTATE, ()), *steps[1:]]
+        log.debug(f"Run {steps} on {in_path}")
+        return Pipeline.process_1_image(in_path, out_path, steps, f"bw{Conf.bd_width}")
 
     @staticmethod
     def rotate_if_needed(in_path: Path, out_path: Path | str) -> tuple:
@@ -79,15 +61,10 @@ class Auto:
         Returns:
             tuple: bool, file path
         """
-        cw_angle, _ = Orientation().detect_floor_by_edge(in_path)
-        log.debug(f"Check by floor: {cw_angle=} in {in_path.name=}.")
+        cw_angle, _ = Orientation.resolve_cw_angle(in_path)
         if cw_angle == -1:
-            log.warning(f"Found no floor in {in_path.name=}. Try by face...")
-            cw_angle = Orientation().get_cw_angle_by_face(in_path)
-            log.debug(f"By face: {cw_angle=}")
-            if cw_angle == -1:
-                log.warning(f"Found no face in {in_path.name=}. Skip.")
-                return False, in_path
+            log.warning(f"Found no orientation in {in_path.name=}. Skip.")
+            return False, in_path
         ok, out_file = Rotate.rotate_1_image((in_path, out_path, cw_angle))
         return ok, out_file
 
@@ -105,10 +82,7 @@ class Auto:
         """
         in_path, out_path, auto_rotate = args
         Common.set_log_by_process()
-        ok, file = Auto.process_an_image(in_path, out_path)
-        if auto_rotate:
-            _, file = Auto.rotate_if_needed(file, out_path)
-        return ok, file
+        return Auto.process_an_image(in_path, out_path, auto_rotate)
 
     @staticmethod
     def auto_on_all(in_path: Path, out_path: Path | str, auto_rotate: bool) -> bool:
@@ -123,15 +97,18 @@ class Auto:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, auto_rotate) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), auto_rotate)
+            for f in image_files
+        )
+        log.debug(f"Auto process files in {in_path} ...")
+        # Decode, LANCZOS resize, OpenCV and encode release the GIL; the
+        # piexif work is small next to them
+        success_cnt, files_cnt = Common.executor_progress(
+            Auto.auto_do_1_image, "Auto process image files", tasks, gil_bound=False
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Auto process {files_cnt} files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            Auto.auto_do_1_image, "Auto process image files", tasks
-        )
         log.info(f"\nAuto processed {success_cnt}/{files_cnt} files")
         return True
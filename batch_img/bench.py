@@ -0,0 +1,345 @@
+"""class Bench: benchmark the throughput of the batch operations on a corpus of
+image files per executor and workers count, and compare with a saved baseline
+Copyright © 2025 John Liu
+"""
+
+import json
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from multiprocessing import cpu_count, get_context
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import piexif
+import pillow_heif
+from loguru import logger as log
+from PIL import Image
+
+from batch_img.auto import Auto
+from batch_img.border import Border
+from batch_img.common import Common
+from batch_img.const import MB, PKG_NAME, PROCESS, THREAD
+from batch_img.do_effect import DoEffect
+from batch_img.effect import EFFECTS
+from batch_img.no_gps import NoGps
+from batch_img.opts import OPTS
+from batch_img.resize import Resize
+from batch_img.rotate import Rotate
+from batch_img.stats import STATS
+from batch_img.transparent import Transparent
+
+try:
+    import resource  # Unix only
+except ImportError:  # pragma: no cover
+    resource = None
+
+pillow_heif.register_heif_opener()
+
+# Operation name: (batch function on a dir, args after in_path and out_path)
+BENCH_OPS = {
+    "resize": (Resize.resize_all_progress_bar, (1920,)),
+    "border": (Border.border_all_in_dir, (5, "gray")),
+    "rotate": (Rotate.rotate_all_in_dir, (90,)),
+    "remove_gps": (NoGps.remove_all_images_gps, ()),
+    "transparent": (Transparent.all_images_transparency, (127, True, 0)),
+    **{f"effect_{name}": (DoEffect.apply_all_in_dir, (name,)) for name in EFFECTS},
+    "auto": (Auto.auto_on_all, (False,)),
+    "auto_rotate": (Auto.auto_on_all, (True,)),
+}
+BENCH_FORMATS = {".jpg": "JPEG", ".png": "PNG", ".heic": "HEIF"}
+# Larger than the 1920 resize of resize and auto, not to bench the upscale
+BENCH_SIZES = "2048x1536,4032x3024"
+BENCH_EXECUTORS = (THREAD, PROCESS)
+# The GPS in the EXIF of the generated files, for remove_gps to strip
+BENCH_GPS = {
+    piexif.GPSIFD.GPSLatitudeRef: b"N",
+    piexif.GPSIFD.GPSLatitude: ((37, 1), (46, 1), (3000, 100)),
+    piexif.GPSIFD.GPSLongitudeRef: b"W",
+    piexif.GPSIFD.GPSLongitude: ((122, 1), (25, 1), (900, 100)),
+}
+
+
+@dataclass
+class BenchResult:  # pylint: disable=too-many-instance-attributes
+    op: str
+    executor: str
+    workers: int
+    files: int
+    ok: bool
+    seconds: float
+    images_s: float
+    mp_s: float
+    p50_ms: float
+    p95_ms: float
+    peak_rss_mb: float
+
+    @property
+    def key(self) -> str:
+        """Get the key to match the same case in a baseline"""
+        return f"{self.op} {self.executor} x{self.workers or 'auto'}"
+
+
+class Bench:
+    @staticmethod
+    def parse_sizes(text: str) -> tuple:
+        """Parse the image sizes str, e.g. "2048x1536,4032x3024"
+
+        Args:
+            text: comma separated WIDTHxHEIGHT
+
+        Returns:
+            tuple: bool, list of (width, height) or error message str
+        """
+        sizes = []
+        for item in text.split(","):
+            try:
+                width, height = (int(v) for v in item.lower().split("x"))
+            except ValueError:
+                return False, f"Bad size {item!r}. Use WIDTHxHEIGHT,..."
+            if width < 1 or height < 1:
+                return False, f"Bad size {item!r}. Use WIDTHxHEIGHT,..."
+            sizes.append((width, height))
+        return True, sizes
+
+    @staticmethod
+    def make_image(width: int, height: int, seed: int) -> Image.Image:
+        """Make a synthetic photo-like image: smooth color gradients, edges of
+        the shapes, a white area and sensor-like noise
+
+        Args:
+            width: image width
+            height: image height
+            seed: random seed
+
+        Returns:
+            Image.Image: RGB image
+        """
+        rng = np.random.default_rng(seed)
+        y, x = np.ogrid[0 : 1 : height * 1j, 0 : 1 : width * 1j]
+        freqs = rng.uniform(1, 6, 3)
+        arr = np.empty((height, width, 3), np.float32)
+        for i, freq in enumerate(freqs):
+            arr[:, :, i] = 127 + 100 * np.sin(freq * np.pi * (x + y * (i + 1)))
+        for _ in range(8):
+            cx, cy, r = rng.uniform(0, 1, 3) * (width, height, min(width, height) / 4)
+            arr[(x * width - cx) ** 2 + (y * height - cy) ** 2 < r * r] = rng.uniform(
+                0, 255, 3
+            )
+        arr[: height // 8, : width // 8] = 255  # white for transparent --white
+        arr += rng.normal(0, 6, (height, width, 1)).astype(np.float32)
+        return Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+
+    @staticmethod
+    def make_corpus(folder: Path, sizes: list, count: int) -> list:
+        """Make the synthetic image files in the formats and sizes, with the
+        GPS in EXIF. Keep the files already made
+
+        Args:
+            folder: output dir path
+            sizes: list of (width, height)
+            count: files per format and size
+
+        Returns:
+            list: file paths
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        exif = piexif.dump({"0th": {piexif.ImageIFD.Orientation: 1}, "GPS": BENCH_GPS})
+        files = []
+        for width, height in sizes:
+            for i in range(count):
+                img = Bench.make_image(width, height, seed=i)
+                for suffix, img_format in BENCH_FORMATS.items():
+                    file = folder / f"bench_{width}x{height}_{i}{suffix}"
+                    if not file.exists():
+                        img.save(file, img_format, exif=exif)
+                    files.append(file)
+        log.info(f"Corpus of {len(files)} image files in {folder}")
+        return files
+
+    @staticmethod
+    def get_megapixels(files: list) -> float:
+        """Get the total megapixels of the image files from their headers
+
+        Args:
+            files: image file paths
+
+        Returns:
+            float
+        """
+        total = 0
+        for file in files:
+            with Image.open(file) as img:
+                total += img.width * img.height
+        return total / 1e6
+
+    @staticmethod
+    def get_peak_rss() -> float:
+        """Get the peak RSS in MB of this process and its largest finished
+        child process, e.g. a pool worker
+
+        Returns:
+            float: 0.0 if not supported, e.g. on Windows
+        """
+        if resource is None:  # pragma: no cover
+            return 0.0
+        # ru_maxrss is in KB on Linux, in bytes on macOS. It carries the peak of
+        # the parent over fork and exec, so a spawned child reads its VmHWM
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        try:
+            with open("/proc/self/status", encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peak = int(line.split()[1]) * 1024
+        except OSError:  # pragma: no cover
+            pass
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+        return max(peak, children) / MB
+
+    @staticmethod
+    def run_case(case: tuple) -> BenchResult:
+        """Run an operation on the corpus dir, output to a temp dir. Run it in
+        a fresh process for its own peak RSS
+
+        Args:
+            case: tuple of op name, corpus dir, files count, megapixels
+
+        Returns:
+            BenchResult
+        """
+        op, corpus, files_cnt, megapixels = case
+        func, args = BENCH_OPS[op]
+        STATS.reset()
+        with tempfile.TemporaryDirectory(prefix="bench_") as out_dir:
+            start = perf_counter()
+            ok = func(corpus, Path(out_dir), *args)
+            seconds = perf_counter() - start
+        tasks = STATS.get_latency_summary()
+        return BenchResult(
+            op=op,
+            executor=OPTS.executor,
+            workers=OPTS.workers,
+            files=files_cnt,
+            ok=ok and tasks["count"] == files_cnt,
+            seconds=round(seconds, 3),
+            images_s=round(files_cnt / seconds, 2),
+            mp_s=round(megapixels / seconds, 2),
+            p50_ms=tasks["p50_ms"],
+            p95_ms=tasks["p95_ms"],
+            peak_rss_mb=round(Bench.get_peak_rss(), 1),
+        )
+
+    @staticmethod
+    def run_all(corpus: Path, ops: list, executors: list, workers: list) -> list:
+        """Run each operation by each executor and workers count on the corpus
+
+        Args:
+            corpus: dir path of the image files
+            ops: operation names
+            executors: executor backends
+            workers: workers counts, 0 - auto
+
+        Returns:
+            list: BenchResult
+        """
+        files = list(Common.walk_image_files(corpus))
+        megapixels = Bench.get_megapixels(files)
+        results = []
+        for op in ops:
+            for executor in executors:
+                for n_workers in workers:
+                    options = {**OPTS.to_dict(), "executor": executor}
+                    options["workers"] = n_workers
+                    # A fresh process per case, not to carry over the peak RSS
+                    with ProcessPoolExecutor(
+                        1,
+                        mp_context=get_context("spawn"),
+                        initializer=Common.init_worker,
+                        initargs=(options,),
+                    ) as pool:
+                        case = (op, corpus, len(files), megapixels)
+                        res = pool.submit(Bench.run_case, case).result()
+                    log.info(f"{res.key}: {res.images_s} images/s")
+                    results.append(res)
+        return results
+
+    @staticmethod
+    def format_table(results: list) -> list:
+        """Get the table lines of the results
+
+        Args:
+            results: list of BenchResult
+
+        Returns:
+            list: str lines
+        """
+        lines = [
+            f"{'case':<32} {'files':>5} {'images/s':>9} {'MP/s':>8}"
+            f" {'p50 ms':>9} {'p95 ms':>9} {'RSS MB':>8}"
+        ]
+        for res in results:
+            lines.append(
+                f"{res.key:<32} {res.files:>5} {res.images_s:>9.2f} {res.mp_s:>8.2f}"
+                f" {res.p50_ms:>9.1f} {res.p95_ms:>9.1f} {res.peak_rss_mb:>8.1f}"
+                + ("" if res.ok else "  FAILED")
+            )
+        return lines
+
+    @staticmethod
+    def save_json(results: list, file: Path) -> None:
+        """Save the results to a JSON file, e.g. as a baseline
+
+        Args:
+            results: list of BenchResult
+            file: JSON file path
+
+        Returns:
+            None
+        """
+        data = {
+            "version": Common.get_version(PKG_NAME),
+            "cpu_count": cpu_count(),
+            "results": [asdict(res) for res in results],
+        }
+        file.write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+    @staticmethod
+    def compare(results: list, baseline: Path, tolerance: int) -> list:
+        """Compare the results with the same cases in a baseline JSON file
+
+        Args:
+            results: list of BenchResult
+            baseline: JSON file path from save_json()
+            tolerance: allowed change in percent
+
+        Returns:
+            list: str lines of the regressions
+        """
+        data = json.loads(baseline.read_text(encoding="utf-8"))
+        base = {}
+        for vals in data.get("results", []):
+            old = BenchResult(**vals)
+            base[old.key] = old
+        limit = tolerance / 100
+        regressions = []
+        for res in results:
+            old = base.get(res.key)
+            if not old:
+                continue
+            # (metric, new, old, higher is better)
+            for metric, new_val, old_val, higher in (
+                ("images/s", res.images_s, old.images_s, True),
+                ("p95 ms", res.p95_ms, old.p95_ms, False),
+                ("RSS MB", res.peak_rss_mb, old.peak_rss_mb, False),
+            ):
+                if not old_val:
+                    continue
+                change = new_val / old_val - 1
+                if (-change if higher else change) > limit:
+                    regressions.append(
+                        f"{res.key}: {metric} {new_val} vs {old_val} ({change:+.0%})"
+                    )
+        return regressions
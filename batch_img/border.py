@@ -2,7 +2,6 @@
 Copyright © 2025 John Liu
 """
 
-import os
 from pathlib import Path
 
 import piexif
@@ -11,12 +10,62 @@ from loguru import logger as log
 from PIL import Image
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import EXIF
+from batch_img.stats import STATS
+from batch_img.tiles import Tiles
 
 pillow_heif.register_heif_opener()
+# The crop and the new image of border_img()
+BORDER_BYTES_PER_PX = 8
 
 
 class Border:
+    @staticmethod
+    def border_img(img: Image.Image, bd_width: int, bd_color: str) -> Image.Image:
+        """Add internal border to the image in memory, not to expand the size
+
+        Args:
+            img: image
+            bd_width: border width int
+            bd_color: border color str
+
+        Returns:
+            Image.Image: image with border
+        """
+        width, height = img.size
+        with STATS.stage("border"):
+            if Tiles.get_strip_rows(img, BORDER_BYTES_PER_PX) < height:
+                return Border.paint_border(img, bd_width, bd_color)
+            box = Common.get_crop_box(width, height, bd_width)
+            cropped_img = img.crop(box)
+            bd_img = Image.new(img.mode, (width, height), bd_color)
+            bd_img.paste(cropped_img, (bd_width, bd_width))
+        return bd_img
+
+    @staticmethod
+    def paint_border(img: Image.Image, bd_width: int, bd_color: str) -> Image.Image:
+        """Paint the internal border on the image in place, e.g. a big image
+        over the memory ceiling. The same pixels as border_img()
+
+        Args:
+            img: image
+            bd_width: border width int
+            bd_color: border color str
+
+        Returns:
+            Image.Image: the image with border
+        """
+        width, height = img.size
+        left, top, right, bottom = Common.get_crop_box(width, height, bd_width)
+        for box in (
+            (0, 0, width, top),
+            (0, bottom, width, height),
+            (0, top, left, bottom),
+            (right, top, width, bottom),
+        ):
+            img.paste(bd_color, box)
+        return img
+
     @staticmethod
     def border_1_image(args: tuple) -> tuple:
         """Add internal border to an image file, not to expand the size
@@ -35,24 +84,19 @@ class Border:
         Common.set_log_by_process()
         try:
             with Image.open(in_path) as img:
-                width, height = img.size
-                box = Common.get_crop_box(width, height, bd_width)
-                cropped_img = img.crop(box)
-                bd_img = Image.new(img.mode, (width, height), bd_color)
-                bd_img.paste(cropped_img, (bd_width, bd_width))
+                Common.load_image(img)
+                bd_img = Border.border_img(img, bd_width, bd_color)
 
                 file = Common.set_out_file(in_path, out_path, f"bw{bd_width}")
+                params = {"optimize": True}
                 if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                    exif_bytes = piexif.dump(exif_dict)
-                    bd_img.save(file, img.format, optimize=True, exif=exif_bytes)
-                else:
-                    bd_img.save(file, img.format, optimize=True)
+                    with STATS.stage("exif"):
+                        exif_dict = piexif.load(img.info[EXIF])
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    bd_img, in_path, out_path, file, img.format, **params
+                )
             log.debug(f"Saved image with border to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -74,15 +118,17 @@ class Border:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, bd_width, bd_color) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), bd_width, bd_color)
+            for f in image_files
+        )
+        log.debug(f"Add border to image files in {in_path} ...")
+        # crop / paste and encode release the GIL; piexif is small next to them
+        success_cnt, files_cnt = Common.executor_progress(
+            Border.border_1_image, "Add border to image files", tasks, gil_bound=False
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Add border to {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            Border.border_1_image, "Add border to image files", tasks
-        )
         log.info(f"\nSuccessfully added border to {success_cnt}/{files_cnt} files")
         return True
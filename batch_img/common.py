@@ -4,18 +4,28 @@ Copyright © 2025 John Liu
 
 import hashlib
 import importlib.metadata
-import itertools
+import io
 import json
+import os
+import struct
 import subprocess
 import sys
 import tomllib
 from base64 import b64encode
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import Iterable, Iterator, Sized
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 from datetime import datetime, timedelta
-from multiprocessing import Pool, cpu_count, current_process
+from functools import partial
+from multiprocessing import cpu_count, current_process, get_context
 from os.path import getmtime, getsize
 from pathlib import Path
-from time import time
+from threading import Semaphore
+from time import perf_counter, time
 
 import httpx
 import piexif
@@ -27,22 +37,32 @@ from PIL.TiffImagePlugin import IFDRational
 from tqdm import tqdm
 
 from batch_img.const import (
+    AUTO,
     EXIF,
     EXPIRE_HOUR,
-    PATTERNS,
+    GPS_IFD_TAG,
     PKG_NAME,
+    PROCESS,
     REPLACE,
+    SUFFIXES,
+    THREAD,
+    TIFF_TYPE_SIZES,
     TS_FORMAT,
     UNKNOWN,
     VER,
+    WINDOW_FACTOR,
 )
 from batch_img.log import Log
+from batch_img.manifest import Manifest
+from batch_img.opts import OPTS
+from batch_img.stats import STATS
+from batch_img.tiles import Tiles
 
 pillow_heif.register_heif_opener()
 VER_CACHE = Path(f"~/.{PKG_NAME}_version_cache.json").expanduser()
 
 
-class Common:
+class Common:  # noqa: PLR0904  # pylint: disable=too-many-public-methods
     @staticmethod
     def get_version(pkg_name: str) -> str:
         """Get this package version by various ways
@@ -233,6 +253,52 @@ class Common:
         log.debug("No GPS in EXIF")
         return False, exif_data
 
+    @staticmethod
+    def blank_exif_gps(exif_data: bytes) -> tuple:
+        """Blank the GPS IFD in the EXIF data in place: zero its entries and
+        values, and keep the data length, so it can be spliced into the file
+
+        Args:
+            exif_data: bytes, optionally with the "Exif\\0\\0" header
+
+        Returns:
+            tuple: bool (True - blanked GPS), bytes of the same length
+        """
+        start = 6 if exif_data.startswith(b"Exif\0\0") else 0
+        buf = bytearray(exif_data)
+        try:
+            order = {b"II": "<", b"MM": ">"}[bytes(buf[start : start + 2])]
+
+            def read(fmt: str, pos: int):
+                return struct.unpack_from(order + fmt, buf, start + pos)[0]
+
+            ifd0 = read("I", 4)
+            gps = 0
+            for i in range(read("H", ifd0)):
+                if read("H", ifd0 + 2 + 12 * i) == GPS_IFD_TAG:
+                    gps = read("I", ifd0 + 2 + 12 * i + 8)
+            cnt = read("H", gps) if gps else 0
+            if not cnt:
+                return False, exif_data
+            for i in range(cnt):
+                entry = gps + 2 + 12 * i
+                size = TIFF_TYPE_SIZES.get(read("H", entry + 2), 1) * read(
+                    "I", entry + 4
+                )
+                if size > 4:
+                    offset = start + read("I", entry + 8)
+                    buf[offset : offset + size] = bytes(
+                        len(buf[offset : offset + size])
+                    )
+            # zero count, entries and the next IFD offset
+            offset = start + gps
+            buf[offset : offset + 6 + 12 * cnt] = bytes(6 + 12 * cnt)
+        except (KeyError, struct.error) as e:
+            log.debug(f"Not blank GPS in bad EXIF: {e}")
+            return False, exif_data
+        log.debug("Blanked GPS info in EXIF")
+        return True, bytes(buf)
+
     @staticmethod
     def decode_exif(exif_data: bytes) -> dict:
         """Decode the EXIF data
@@ -390,77 +456,430 @@ class Common:
         return new_width, new_height
 
     @staticmethod
-    def prepare_all_files(in_path: Path, out_path: Path | str):
+    def scan_dir(path: Path) -> tuple:
+        """List the image files and the sub-dirs in a dir by one os.scandir() pass
+
+        Args:
+            path: dir path
+
+        Returns:
+            tuple: list of (key, file path), list of sub-dir paths
         """
+        files, dirs = [], []
+        try:
+            dev = os.stat(path).st_dev
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue  # hidden, e.g. .out/ or .DS_Store
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(Path(entry.path))
+                    elif entry.name.lower().endswith(SUFFIXES) and entry.is_file():
+                        # (device, inode) is the same for any name of the file
+                        key = (dev, entry.inode())
+                        if entry.is_symlink():
+                            st = entry.stat()
+                            key = (st.st_dev, st.st_ino)
+                        files.append((key, Path(entry.path)))
+        except OSError as e:
+            log.error(f"Error scan {path}: {e}")
+        files.sort(key=lambda x: x[1].name)
+        dirs.sort()
+        return files, dirs
+
+    @staticmethod
+    def walk_image_files(in_path: Path, skip: Path | None = None) -> Iterator:
+        """Walk the image files in a dir by level, optionally in sub-dirs.
+        Scan the sub-dirs of a level in threads if OPTS.scan_threads > 1
+
+        Args:
+            in_path: input dir path
+            skip: dir path not to walk into, e.g. the output dir
+
+        Returns:
+            Iterator: image file paths, each file once
+        """
+        seen = set()
+        level = [in_path]
+        workers = max(OPTS.scan_threads or 1, 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while level:
+                with STATS.stage("scan"):
+                    if workers > 1 and len(level) > 1:
+                        results = list(executor.map(Common.scan_dir, level))
+                    else:
+                        results = list(map(Common.scan_dir, level))
+                next_level = []
+                for files, dirs in results:
+                    for key, file in files:
+                        if key not in seen:
+                            seen.add(key)
+                            yield file
+                    next_level.extend(d for d in dirs if d.resolve() != skip)
+                level = next_level if OPTS.recursive else []
+
+    @staticmethod
+    def prepare_all_files(in_path: Path, out_path: Path | str) -> Iterator:
+        """Prepare the output dir and get the image files in the input dir
 
         Args:
             in_path: input dir path
             out_path: output dir path or REPLACE
 
         Returns:
-            iterable: files list generator
+            Iterator: files generator
         """
+        skip = None
         if out_path and out_path != REPLACE:
             out_path.mkdir(parents=True, exist_ok=True)
-        # Fix Path.glob() got 2x count on Windows 10
-        tmp = [in_path.glob(p, case_sensitive=True) for p in PATTERNS]
-        _files = itertools.chain.from_iterable(set(tmp))
-        return _files
+            skip = out_path.expanduser().resolve()
+        return Common.walk_image_files(in_path, skip)
 
     @staticmethod
-    def multiprocess_progress_bar(func, desc: str, tasks: list) -> int:
+    def mirror_out_path(in_path: Path, file: Path, out_path: Path | str):
+        """Mirror the sub-dir of the file under the input dir in the output dir
+
+        Args:
+            in_path: input dir path
+            file: image file path in the input dir
+            out_path: output dir path or REPLACE
+
+        Returns:
+            Path | str: output dir path for the file, or REPLACE / ""
+        """
+        if not out_path or out_path == REPLACE or file.parent == in_path:
+            return out_path
+        return out_path / file.parent.relative_to(in_path)
+
+    @staticmethod
+    def init_worker(options: dict) -> None:
+        """Initialize a worker process with the run-wide options of the parent
+
+        Args:
+            options: run-wide options dict
+
+        Returns:
+            None
+        """
+        OPTS.load(options)
+        Tiles.set_max_pixels()
+        Log.set_worker_log()
+
+    @staticmethod
+    def pick_executor(gil_bound: bool) -> str:
+        """Pick the executor backend for a batch operation
+
+        Args:
+            gil_bound: the operation hot path holds the GIL (pure Python code)
+
+        Returns:
+            str: PROCESS or THREAD
+        """
+        if OPTS.executor in {PROCESS, THREAD}:
+            return OPTS.executor
+        if OPTS.executor != AUTO:
+            log.warning(f"Bad executor={OPTS.executor!r}. Use {AUTO!r}")
+        # Threads run in parallel only if the hot path releases the GIL
+        return PROCESS if gil_bound else THREAD
+
+    @staticmethod
+    def get_workers(tasks: Iterable) -> int:
+        """Get the number of workers for the tasks
+
+        Args:
+            tasks: tasks list, or iterator of unknown length
+
+        Returns:
+            int
+        """
+        workers = OPTS.workers if OPTS.workers > 0 else max(cpu_count(), 4)
+        if isinstance(tasks, Sized):
+            workers = max(min(workers, len(tasks)), 1)
+        return workers
+
+    @staticmethod
+    def get_window(workers: int) -> int:
+        """Get the max number of in-flight tasks
+
+        Args:
+            workers: number of workers int
+
+        Returns:
+            int
+        """
+        if OPTS.window and OPTS.window > 0:
+            return OPTS.window
+        return workers * WINDOW_FACTOR
+
+    @staticmethod
+    def throttle(tasks: Iterable, slots: Semaphore) -> Iterator:
+        """Pull the tasks lazily, only when a slot in the window is free
+
+        Args:
+            tasks: tasks iterable
+            slots: semaphore of the free slots, released by the consumer
+
+        Returns:
+            Iterator: tasks
+        """
+        try:
+            for task in tasks:
+                slots.acquire()
+                yield task
+        finally:
+            # Keep the scan stage of the pulling thread, e.g. the pool feeder
+            STATS.merge(STATS.pop())
+
+    @staticmethod
+    def run_task(func, task) -> tuple:
+        """Run the function on a task, and keep the task with its result
+
+        Args:
+            func: per task function returns (ok, res)
+            task: task params
+
+        Returns:
+            tuple: task, ok, res, stats and seconds of the task
+        """
+        start = perf_counter()
+        ok, res = func(task)
+        return task, ok, res, STATS.pop(), perf_counter() - start
+
+    @staticmethod
+    def tally(result: tuple, pbar: tqdm, on_ok=None) -> int:
+        """Count one finished task on the progress bar
+
+        Args:
+            result: tuple of task, ok, res, stats and seconds of the task
+            pbar: progress bar
+            on_ok: callback on the task if success, e.g. record it in manifest
+
+        Returns:
+            int: 1 - Success. 0 - Error
+        """
+        task, ok, res, stats, seconds = result
+        STATS.merge(stats)
+        STATS.add_latency(seconds)
+        if not ok:
+            tqdm.write(f"Error: {res}")
+        elif on_ok:
+            on_ok(task)
+        pbar.update(1)
+        return 1 if ok else 0
+
+    @staticmethod
+    def multiprocess_progress_bar(
+        func, desc: str, tasks: Iterable, on_ok=None
+    ) -> tuple:
         """Run task in multiprocess with progress bar
 
         Args:
             func: function to be run in multiprocess
             desc: description str
-            tasks: tasks list for multiprocess pool
+            tasks: tasks list or iterator for multiprocess pool
+            on_ok: callback on each successful task
 
         Returns:
-            int: success_cnt
+            tuple: success_cnt, all_cnt
         """
         success_cnt = 0
-        all_cnt = len(tasks)
-        workers = min(max(cpu_count(), 4), all_cnt)
-
-        with Pool(workers) as pool:
-            with tqdm(total=all_cnt, desc=desc) as pbar:
-                for ok, res in pool.imap_unordered(func, tasks):
-                    if ok:
-                        success_cnt += 1
-                    else:
-                        tqdm.write(f"Error: {res}")
-                    pbar.update(1)
-        return success_cnt
+        total = len(tasks) if isinstance(tasks, Sized) else None
+        workers = Common.get_workers(tasks)
+        window = Common.get_window(workers)
+        # imap_unordered() drains its input in a feeder thread, so gate the input
+        slots = Semaphore(window)
+
+        # spawn, not fork: forking a multi-threaded parent (OpenCV, onnxruntime)
+        # may deadlock. It is also the default on macOS and Windows
+        with get_context("spawn").Pool(
+            workers, initializer=Common.init_worker, initargs=(OPTS.to_dict(),)
+        ) as pool:
+            # total=None shows the count only, as the number is not known yet
+            with tqdm(total=total, desc=desc) as pbar:
+                try:
+                    for result in pool.imap_unordered(
+                        partial(Common.run_task, func), Common.throttle(tasks, slots)
+                    ):
+                        slots.release()
+                        success_cnt += Common.tally(result, pbar, on_ok)
+                finally:
+                    # Unblock the feeder thread if stopped early
+                    for _ in range(window):
+                        slots.release()
+                all_cnt = pbar.n
+        return success_cnt, all_cnt
 
     @staticmethod
-    def executor_progress(func, desc: str, tasks: list) -> int:
-        """ProcessPoolExecutor / ThreadPoolExecutor + progress bar
+    def thread_progress_bar(func, desc: str, tasks: Iterable, on_ok=None) -> tuple:
+        """Run task in threads with progress bar
 
         Args:
-            func: function to be run in multiprocess
+            func: function to be run in threads
             desc: description str
-            tasks: tasks list for multiprocess pool
+            tasks: tasks list or iterator
+            on_ok: callback on each successful task
 
         Returns:
-            int: success_cnt
+            tuple: success_cnt, all_cnt
         """
         success_cnt = 0
-        all_cnt = len(tasks)
-        workers = min(max(cpu_count(), 4), all_cnt)
+        total = len(tasks) if isinstance(tasks, Sized) else None
+        workers = Common.get_workers(tasks)
+        window = Common.get_window(workers)
 
         with ThreadPoolExecutor(max_workers=workers) as executor:
-            futures = [executor.submit(func, task) for task in tasks]
-            with tqdm(total=len(futures), desc=desc) as pbar:
+            with tqdm(total=total, desc=desc) as pbar:
+                futures = set()
+                for task in tasks:
+                    if len(futures) >= window:
+                        done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            success_cnt += Common.tally(future.result(), pbar, on_ok)
+                    futures.add(executor.submit(Common.run_task, func, task))
                 # as_completed to iterate over futures as they finish
                 for future in as_completed(futures):
-                    ok, res = future.result()
-                    if ok:
-                        success_cnt += 1
-                    else:
-                        tqdm.write(f"error: {res}")
-                    pbar.update(1)
-        return success_cnt
+                    success_cnt += Common.tally(future.result(), pbar, on_ok)
+                all_cnt = pbar.n
+        return success_cnt, all_cnt
+
+    @staticmethod
+    def executor_progress(
+        func, desc: str, tasks: Iterable, gil_bound: bool = False
+    ) -> tuple:
+        """Process pool (multiprocessing.Pool) or ThreadPoolExecutor + progress bar.
+        Pull the tasks lazily and keep only a bounded window of them in flight.
+        In the incremental mode, skip the files unchanged since the last same run
+
+        Args:
+            func: function to be run in multiprocess
+            desc: description str
+            tasks: tasks list, or iterator (e.g. generator on the dir files)
+            gil_bound: the func hot path holds the GIL, so 'auto' picks processes
+
+        Returns:
+            tuple: success_cnt, all_cnt (both include the skipped files)
+        """
+        backend = Common.pick_executor(gil_bound)
+        log.debug(f"Run {func.__qualname__} by {backend=}")
+        run = Common.thread_progress_bar
+        if backend == PROCESS:
+            run = Common.multiprocess_progress_bar
+        if not OPTS.incremental:
+            return run(func, desc, tasks)
+
+        manifest = Manifest(OPTS.content_hash)
+        try:
+            success_cnt, all_cnt = run(
+                func,
+                desc,
+                manifest.pending(func, tasks),
+                partial(manifest.record, func),
+            )
+        finally:
+            manifest.save()
+        if manifest.skipped:
+            log.info(f"Skipped {manifest.skipped} unchanged files")
+        return success_cnt + manifest.skipped, all_cnt + manifest.skipped
+
+    @staticmethod
+    def same_bytes(file: Path, data: bytes) -> bool:
+        """Check if the file content is the same as the data
+
+        Args:
+            file: file path
+            data: bytes
+
+        Returns:
+            bool
+        """
+        try:
+            if getsize(file) != len(data):
+                return False
+            with open(file, "rb") as f:
+                return f.read() == data
+        except OSError:
+            return False
+
+    @staticmethod
+    def save_image(
+        img: Image.Image,
+        in_path: Path,
+        out_path: Path | str,
+        file: Path,
+        img_format: str,
+        **params,
+    ) -> Path:
+        """Save the image to the output file, then replace the input file if
+        out_path is REPLACE. In the incremental mode, not rewrite the target
+        if it already has the same encoded bytes
+
+        Args:
+            img: image to save
+            in_path: input file path
+            out_path: output dir path or REPLACE
+            file: output file path from set_out_file()
+            img_format: image format str, e.g. "JPEG"
+            **params: save params, e.g. optimize, exif
+
+        Returns:
+            Path: the saved file path
+        """
+        if OPTS.incremental:
+            buf = io.BytesIO()
+            with STATS.stage("encode"):
+                img.save(buf, img_format, **params)
+            return Common.save_bytes(buf.getvalue(), in_path, out_path, file)
+        with STATS.stage("encode"):
+            img.save(file, img_format, **params)
+        if out_path == REPLACE:
+            with STATS.stage("replace"):
+                os.replace(file, in_path)
+            log.debug(f"Replaced {in_path} with the new tmp_file")
+            return in_path
+        return file
+
+    @staticmethod
+    def save_bytes(
+        data: bytes, in_path: Path, out_path: Path | str, file: Path
+    ) -> Path:
+        """Save the encoded image bytes to the output file, then replace the
+        input file if out_path is REPLACE. In the incremental mode, not rewrite
+        the target if it already has the same bytes
+
+        Args:
+            data: encoded image file bytes
+            in_path: input file path
+            out_path: output dir path or REPLACE
+            file: output file path from set_out_file()
+
+        Returns:
+            Path: the saved file path
+        """
+        target = in_path if out_path == REPLACE else file
+        if OPTS.incremental and Common.same_bytes(target, data):
+            log.debug(f"Not rewrite {target} as the same bytes")
+            return target
+        with STATS.stage("write"), open(file, "wb") as f:
+            f.write(data)
+        if out_path == REPLACE:
+            with STATS.stage("replace"):
+                os.replace(file, in_path)
+            log.debug(f"Replaced {in_path} with the new tmp_file")
+        return target
+
+    @staticmethod
+    def load_image(img: Image.Image) -> None:
+        """Decode the opened image now, not lazily in its first operation, to
+        time the decode stage
+
+        Args:
+            img: opened image
+
+        Returns:
+            None
+        """
+        with STATS.stage("decode"):
+            img.load()
 
     @staticmethod
     def set_out_file(in_path: Path, out_path: Path | str, extra: str = "") -> Path:
@@ -13,18 +13,52 @@ MSG_OK = "✅ Processed the image file(s)"
 MSG_BAD = "❌ Failed to process image file(s)."
 
 TS_FORMAT = "%Y-%m-%d_%H-%M-%S"
-PATTERNS = (
-    "*.HEIC",
-    "*.heic",
-    "*.JPG",
-    "*.jpg",
-    "*.JPEG",
-    "*.jpeg",
-    "*.PNG",
-    "*.png",
-)
+# Image file suffixes, matched case-insensitively
+SUFFIXES = (".heic", ".jpeg", ".jpg", ".png")
 REPLACE = "replace"
 EXIF = "exif"
+# GPSInfo tag in EXIF IFD0, and bytes per value of the TIFF field types
+GPS_IFD_TAG = 0x8825
+TIFF_TYPE_SIZES = {
+    1: 1,
+    2: 1,
+    3: 2,
+    4: 4,
+    5: 8,
+    6: 1,
+    7: 1,
+    8: 2,
+    9: 4,
+    10: 8,
+    11: 4,
+    12: 8,
+}
+# Lossless JPEG rotation by jpegtran on the DCT coefficients: perfect - only
+# if no partial MCU at the edges to move, trim - drop the partial MCU edges
+PERFECT = "perfect"
+TRIM = "trim"
+OFF = "off"
+JPEG_LOSSLESS = (PERFECT, TRIM, OFF)
+# JPEG draft decode keeps >= 1.5x of the resize size for the LANCZOS
+# resample to finish, so the output is visually the same (PSNR > 45 dB)
+DRAFT_GAP = 1.5
+# rembg models to remove background. u2net - the original default
+U2NET = "u2net"
+BG_MODELS = (U2NET, "u2netp", "u2net_human_seg", "isnet-general-use", "silueta")
+# Memory ceiling per worker (--max_memory) in MB. Pillow decodes an RGB or
+# RGBA image in 4 bytes per pixel
+MB = 1 << 20
+DECODED_BYTES_PER_PX = 4
+# Per-dir record of the processed files in the incremental mode
+MANIFEST = f".{PKG_NAME}_manifest.json"
+
+# Executor backends of the batch operations on a folder
+AUTO = "auto"
+PROCESS = "process"
+THREAD = "thread"
+EXECUTORS = (AUTO, PROCESS, THREAD)
+# Default max in-flight tasks per worker
+WINDOW_FACTOR = 4
 
 
 # Resize to 1920-pixel max length
@@ -11,7 +11,9 @@ from PIL import Image
 
 from batch_img.common import Common
 from batch_img.const import EXIF
-from batch_img.effect import Effect
+from batch_img.effect import HALOS, WORK_BYTES_PER_PX, Effect
+from batch_img.stats import STATS
+from batch_img.tiles import Tiles
 
 pillow_heif.register_heif_opener()
 
@@ -21,6 +23,50 @@ class DoEffect:
     Apply advanced image effects
     """
 
+    @staticmethod
+    def effect_img(img: Image.Image, in_path: Path, effect_name: str) -> Image.Image:
+        """Apply the special effect to the image in memory. Run a local effect
+        in row strips over the memory ceiling
+
+        Args:
+            img: image
+            in_path: image file path, for the error message
+            effect_name: effect name string, "neon", "hdr", etc.
+
+        Returns:
+            Image.Image: image with the effect
+        """
+        with STATS.stage(f"effect {effect_name}"):
+            if effect_name not in HALOS:
+                # Not local, e.g. the hdr CLAHE on the whole image
+                return DoEffect.effect_whole_img(img, in_path, effect_name)
+            return Tiles.map_strips(
+                img,
+                lambda strip: DoEffect.effect_whole_img(strip, in_path, effect_name),
+                WORK_BYTES_PER_PX,
+                HALOS[effect_name],
+                "RGB" if img.mode in {"RGB", "RGBA"} else "",
+            )
+
+    @staticmethod
+    def effect_whole_img(
+        img: Image.Image, in_path: Path, effect_name: str
+    ) -> Image.Image:
+        """Apply the special effect to the whole image in memory at once
+
+        Args:
+            img: image
+            in_path: image file path, for the error message
+            effect_name: effect name string, "neon", "hdr", etc.
+
+        Returns:
+            Image.Image: image with the effect
+        """
+        new_img, _ = Effect().apply_effects(img, in_path, effect_name)
+        if new_img is None:
+            raise ValueError(f"{in_path} got bad image data")
+        return Image.fromarray(new_img)
+
     @staticmethod
     def apply_1_image(args: tuple) -> tuple:
         """Apply the special effect to one image file
@@ -39,17 +85,17 @@ class DoEffect:
         try:
             in_path = in_path.expanduser()
             with Image.open(in_path) as img:
-                new_img, _ = Effect().apply_effects(img, in_path, effect_name)
-                if new_img is None:
-                    return False, f"{in_path} got bad image data"
-                p_img = Image.fromarray(new_img)
+                Common.load_image(img)
+                p_img = DoEffect.effect_img(img, in_path, effect_name)
                 file = Common.set_out_file(in_path, out_path, effect_name)
+                params = {"optimize": True}
                 if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                    exif_bytes = piexif.dump(exif_dict)
-                    p_img.save(file, img.format, optimize=True, exif=exif_bytes)
-                else:
-                    p_img.save(file, img.format, optimize=True)
+                    with STATS.stage("exif"):
+                        exif_dict = piexif.load(img.info[EXIF])
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    p_img, in_path, out_path, file, img.format, **params
+                )
             log.debug(f"Saved {effect_name=} image to {file}")
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
@@ -69,15 +115,20 @@ class DoEffect:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, effect_name) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), effect_name)
+            for f in image_files
+        )
+        log.debug(f"Apply special effect to image files in {in_path} ...")
+        # OpenCV / NumPy kernels release the GIL
+        success_cnt, files_cnt = Common.executor_progress(
+            DoEffect.apply_1_image,
+            "Apply special effect to image files",
+            tasks,
+            gil_bound=False,
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Apply special effect to {files_cnt} image files ...")
-        success_cnt = Common.executor_progress(
-            DoEffect.apply_1_image, "Apply special effect to image files", tasks
-        )
         log.info(f"\nCompleted the special effect to {success_cnt}/{files_cnt} files")
         return True
@@ -3,11 +3,103 @@ Copyright © 2025 John Liu
 """
 
 import click
-from loguru import logger as log
 
+from batch_img.bench import BENCH_EXECUTORS, BENCH_OPS, BENCH_SIZES
 from batch_img.common import Common
-from batch_img.const import MSG_BAD, MSG_OK, PKG_NAME
+from batch_img.const import (
+    AUTO,
+    BG_MODELS,
+    EXECUTORS,
+    JPEG_LOSSLESS,
+    MSG_BAD,
+    MSG_OK,
+    OFF,
+    PERFECT,
+    PKG_NAME,
+    TRIM,
+    U2NET,
+    WINDOW_FACTOR,
+)
 from batch_img.main import Main
+from batch_img.pipeline import STEPS_HELP
+
+
+def batch_options(func):
+    """Add the options shared by the sub-commands on a folder of image files"""
+    options = (
+        click.option(
+            "--executor",
+            default=AUTO,
+            show_default=True,
+            type=click.Choice(EXECUTORS),
+            help="Run the image files in processes or threads. auto - pick per"
+            " action by whether it holds the Python GIL.",
+        ),
+        click.option(
+            "--workers",
+            default=0,
+            show_default=True,
+            type=click.IntRange(min=0),
+            help="Number of processes or threads. 0 - the CPU count, at least 4.",
+        ),
+        click.option(
+            "--window",
+            default=0,
+            show_default=True,
+            type=click.IntRange(min=0),
+            help="Max number of image files in flight at a time."
+            f" 0 - {WINDOW_FACTOR} x the workers count.",
+        ),
+        click.option(
+            "-r",
+            "--recursive",
+            is_flag=True,
+            help="Also process the image files in the sub-dirs. The output dir"
+            " mirrors the sub-dirs.",
+        ),
+        click.option(
+            "--scan_threads",
+            default=1,
+            show_default=True,
+            type=click.IntRange(min=1),
+            help="Threads to scan the sub-dirs in parallel, e.g. on network drives.",
+        ),
+        click.option(
+            "--incremental",
+            is_flag=True,
+            help="Skip the image files unchanged since the last run with the same"
+            " action and options. Not rewrite the same output bytes.",
+        ),
+        click.option(
+            "--hash",
+            "content_hash",
+            is_flag=True,
+            help="With --incremental, also compare the file content hash, e.g. the"
+            " files touched by a sync client.",
+        ),
+        click.option(
+            "--max_memory",
+            default=0,
+            show_default=True,
+            type=click.IntRange(min=0),
+            help="Memory ceiling in MB per worker. Open the images up to it over"
+            " the Pillow decompression bomb guard, and run border, transparent,"
+            " blur and neon in row strips within it. 0 - no ceiling.",
+        ),
+    )
+    options += (
+        click.option(
+            "--timings",
+            default="",
+            metavar="FILE",
+            help="Time the stages of the image files, e.g. decode, resize, exif,"
+            " encode, and log the totals with p50/p95. Also save them to the JSON"
+            " FILE, unless FILE is '-'.",
+        ),
+    )
+    for option in reversed(options):
+        func = option(func)
+    return func
 
 
 @click.group(invoke_without_command=True)
@@ -45,13 +137,87 @@ def cli(ctx, update, version):  # pragma: no cover
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def auto(src_path, auto_rotate, output):
-    options = {"src_path": src_path, "auto_rotate": auto_rotate, "output": output}
+@batch_options
+def auto(src_path, auto_rotate, output, **batch):
+    options = {
+        "src_path": src_path,
+        "auto_rotate": auto_rotate,
+        "output": output,
+        **batch,
+    }
     res = Main.auto(options)
     msg = MSG_OK if res else MSG_BAD
     click.secho(msg)
 
 
+@cli.command(help="Benchmark the throughput of the operations on image files.")
+@click.option(
+    "--corpus",
+    default="",
+    help="Dir of the image files to run on. If no image files in it, generate"
+    " the synthetic JPEG, PNG and HEIC files. Default: a temp dir.",
+)
+@click.option(
+    "--sizes",
+    default=BENCH_SIZES,
+    show_default=True,
+    help="WIDTHxHEIGHT,... of the generated image files.",
+)
+@click.option(
+    "--count",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Generated image files per format and size.",
+)
+@click.option(
+    "--op",
+    "ops",
+    multiple=True,
+    type=click.Choice(list(BENCH_OPS)),
+    help="Operation to run, repeat for more. Default: all.",
+)
+@click.option(
+    "--executor",
+    "executors",
+    multiple=True,
+    type=click.Choice(BENCH_EXECUTORS),
+    help="Executor to run by, repeat for more. Default: all.",
+)
+@click.option(
+    "--workers",
+    "workers_counts",
+    multiple=True,
+    type=click.IntRange(min=0),
+    help="Workers count to run by, repeat for more. Default: 0 - the CPU"
+    " count, at least 4.",
+)
+@click.option(
+    "--max_memory",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Memory ceiling in MB per worker, as in the other commands.",
+)
+@click.option("--json", "json_file", default="", help="Save the results to JSON.")
+@click.option(
+    "--baseline",
+    default="",
+    help="JSON file of the saved results to compare with, flag the regressions.",
+)
+@click.option(
+    "--tolerance",
+    default=10,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Allowed change in percent from the baseline.",
+)
+def bench(**options):
+    res = Main.bench(options)
+    msg = MSG_OK if res else MSG_BAD
+    click.secho(msg)
+
+
 @cli.command(help="Add internal border to image file(s), not expand the size.")
 @click.argument(
     "src_path",
@@ -80,12 +246,14 @@ def auto(src_path, auto_rotate, output):
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def border(src_path, border_width, border_color, output):
+@batch_options
+def border(src_path, border_width, border_color, output, **batch):
     options = {
         "src_path": src_path,
         "border_width": border_width,
         "border_color": border_color,
         "output": output,
+        **batch,
     }
     res = Main.border(options)
     msg = MSG_OK if res else MSG_BAD
@@ -115,13 +283,43 @@ def border(src_path, border_width, border_color, output):
     help="Output dir path. If not specified, add special effect image file(s)"
     " to the same path as the input file(s).",
 )
-def do_effect(src_path, effect, output):
-    options = {"src_path": src_path, "effect": effect, "output": output}
+@batch_options
+def do_effect(src_path, effect, output, **batch):
+    options = {"src_path": src_path, "effect": effect, "output": output, **batch}
     res = Main.do_effect(options)
     msg = MSG_OK if res else MSG_BAD
     click.secho(msg)
 
 
+@cli.command(help="Run the steps in order on image file(s), decode and encode once.")
+@click.argument(
+    "src_path",
+    required=True,
+)
+@click.option(
+    "-s",
+    "--step",
+    "steps",
+    multiple=True,
+    required=True,
+    help=f"A step, repeat in order: {STEPS_HELP}",
+)
+@click.option(
+    "-o",
+    "--output",
+    default="",
+    show_default=True,
+    type=str,
+    help="Output file path. If not specified, replace the input file.",
+)
+@batch_options
+def pipeline(src_path, steps, output, **batch):
+    options = {"src_path": src_path, "steps": steps, "output": output, **batch}
+    res = Main.pipeline(options)
+    msg = MSG_OK if res else MSG_BAD
+    click.secho(msg)
+
+
 @cli.command(help="Remove background (make background transparent) in image file(s).")
 @click.argument(
     "src_path",
@@ -135,9 +333,28 @@ def do_effect(src_path, effect, output):
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def remove_bg(src_path, output):
-    log.info("Loading u2net.onnx to identify the background... Please be patient.")
-    options = {"src_path": src_path, "output": output}
+@click.option(
+    "--model",
+    default=U2NET,
+    show_default=True,
+    type=click.Choice(BG_MODELS),
+    help="The model to identify the background. Loaded once per process.",
+)
+@click.option(
+    "--model_dir",
+    default="",
+    help="Local dir of the model files, e.g. offline. Default: the rembg home"
+    " dir, downloads the model on first use.",
+)
+@batch_options
+def remove_bg(src_path, output, model, model_dir, **batch):
+    options = {
+        "src_path": src_path,
+        "output": output,
+        "model": model,
+        "model_dir": model_dir,
+        **batch,
+    }
     res = Main.remove_bg(options)
     msg = MSG_OK if res else MSG_BAD
     click.secho(msg)
@@ -156,8 +373,9 @@ def remove_bg(src_path, output):
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def remove_gps(src_path, output):
-    options = {"src_path": src_path, "output": output}
+@batch_options
+def remove_gps(src_path, output, **batch):
+    options = {"src_path": src_path, "output": output, **batch}
     res = Main.remove_gps(options)
     msg = MSG_OK if res else MSG_BAD
     click.secho(msg)
@@ -186,8 +404,9 @@ def remove_gps(src_path, output):
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def resize(src_path, length, output):
-    options = {"src_path": src_path, "length": length, "output": output}
+@batch_options
+def resize(src_path, length, output, **batch):
+    options = {"src_path": src_path, "length": length, "output": output, **batch}
     res = Main.resize(options)
     msg = MSG_OK if res else MSG_BAD
     click.secho(msg)
@@ -207,6 +426,15 @@ def resize(src_path, length, output):
     type=click.Choice([0, 90, 180, 270]),
     help="Rotate image file(s) to the clockwise angle. 0 - no rotate.",
 )
+@click.option(
+    "--jpeg_lossless",
+    default=PERFECT,
+    show_default=True,
+    type=click.Choice(JPEG_LOSSLESS),
+    help="Rotate JPEG losslessly by jpegtran, if installed. perfect - only if"
+    f" no partial MCU edge, else re-encode. {TRIM} - drop the partial MCU edge."
+    f" {OFF} - always re-encode.",
+)
 @click.option(
     "-o",
     "--output",
@@ -215,11 +443,14 @@ def resize(src_path, length, output):
     type=str,
     help="Output file path. If not specified, replace the input file.",
 )
-def rotate(src_path, angle, output):
+@batch_options
+def rotate(src_path, angle, jpeg_lossless, output, **batch):
     options = {
         "src_path": src_path,
         "angle": angle,
+        "jpeg_lossless": jpeg_lossless,
         "output": output,
+        **batch,
     }
     res = Main.rotate(options)
     msg = MSG_OK if res else MSG_BAD
@@ -257,12 +488,23 @@ def rotate(src_path, angle, output):
     is_flag=True,
     help="Make white pixels fully transparent.",
 )
-def transparent(src_path, output, transparency, white):
+@click.option(
+    "--white_tolerance",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0, max=255),
+    help="With --white, also make the near-white pixels fully transparent:"
+    " every band >= 255 - white_tolerance.",
+)
+@batch_options
+def transparent(src_path, output, transparency, white, white_tolerance, **batch):
     options = {
         "src_path": src_path,
         "output": output,
         "transparency": transparency,
         "white": white,
+        "white_tolerance": white_tolerance,
+        **batch,
     }
     res = Main.transparent(options)
     msg = MSG_OK if res else MSG_BAD
@@ -16,6 +16,7 @@ from batch_img.const import PKG_NAME, TS_FORMAT
 class Log:
     _file = ""
     _conf = {}
+    _worker = False
 
     @staticmethod
     def load_config(path: str) -> dict:
@@ -91,6 +92,9 @@ class Log:
         Returns:
             logger: for this worker process
         """
+        if Log._worker:  # init only once per worker process
+            return logger
+        Log._worker = True
         logger.remove()
         level, logformat, backtrace, diagnose, to_file = Log._get_settings()
         logger.add(
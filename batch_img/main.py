@@ -3,21 +3,27 @@ Copyright © 2025 John Liu
 """
 
 import json
+import tempfile
 from pathlib import Path
 from time import time
 
 from loguru import logger as log
 
 from batch_img.auto import Auto
+from batch_img.bench import BENCH_EXECUTORS, BENCH_OPS, BENCH_SIZES, Bench
 from batch_img.border import Border
 from batch_img.common import Common
 from batch_img.const import PKG_NAME, REPLACE
 from batch_img.do_effect import DoEffect
 from batch_img.log import Log
 from batch_img.no_gps import NoGps
+from batch_img.opts import OPTS
+from batch_img.pipeline import Pipeline
 from batch_img.remove_bg import RemoveBg
 from batch_img.resize import Resize
 from batch_img.rotate import Rotate
+from batch_img.stats import STATS
+from batch_img.tiles import Tiles
 from batch_img.transparent import Transparent
 
 
@@ -34,6 +40,9 @@ class Main:
         """
         Log.init_log_file()
         log.debug(f"{json.dumps(options, indent=2)}")
+        OPTS.load(options)
+        Tiles.set_max_pixels()
+        STATS.reset()
         return time()
 
     @staticmethod
@@ -47,10 +56,41 @@ class Main:
             str: human-readable elapsed time string
         """
         Common.check_latest_version(PKG_NAME)
+        STATS.merge(STATS.pop())  # run in this thread, e.g. on a single file
+        for line in STATS.report():
+            log.info(line)
+        if OPTS.timings:
+            Main.save_timings(time() - start_ts)
         duration = Common.human_readable_time(time() - start_ts)
         log.info(f"Elapsed time: {duration}")
         return duration
 
+    @staticmethod
+    def save_timings(seconds: float) -> None:
+        """Log the task latency percentiles, and save them with the stage
+        timings to the --timings JSON file, unless it is '-'
+
+        Args:
+            seconds: elapsed time of the run
+
+        Returns:
+            None
+        """
+        tasks = STATS.get_latency_summary()
+        log.info(
+            f"Tasks: {tasks['count']} files, p50 {tasks['p50_ms']} ms,"
+            f" p95 {tasks['p95_ms']} ms, max {tasks['max_ms']} ms"
+        )
+        if OPTS.timings == "-":
+            return
+        data = {
+            "elapsed_s": round(seconds, 3),
+            "tasks": tasks,
+            "stages": STATS.to_dict(),
+        }
+        Path(OPTS.timings).write_text(json.dumps(data, indent=2), encoding="utf-8")
+        log.info(f"Saved the timings to {OPTS.timings}")
+
     @staticmethod
     def auto(options: dict) -> bool:
         """Auto process image file(s):
@@ -80,6 +120,46 @@ class Main:
         Main._conclude(start_ts)
         return ok
 
+    @staticmethod
+    def bench(options: dict) -> bool:
+        """Benchmark the operations on a corpus of image files, by each
+        executor and workers count
+
+        Args:
+            options: input options dict
+
+        Returns:
+            bool: True - Success. False - Error or regression from the baseline
+        """
+        start_ts = Main._prepare(options)
+        ok, sizes = Bench.parse_sizes(options.get("sizes") or BENCH_SIZES)
+        if not ok:
+            log.error(sizes)
+            return False
+        with tempfile.TemporaryDirectory(prefix="bench_corpus_") as tmp_dir:
+            corpus = Path(options.get("corpus") or tmp_dir)
+            if not corpus.is_dir() or not any(Common.walk_image_files(corpus)):
+                Bench.make_corpus(corpus, sizes, options.get("count") or 1)
+            results = Bench.run_all(
+                corpus,
+                options.get("ops") or list(BENCH_OPS),
+                options.get("executors") or list(BENCH_EXECUTORS),
+                options.get("workers_counts") or [0],
+            )
+        for line in Bench.format_table(results):
+            log.info(line)
+        if options.get("json_file"):
+            Bench.save_json(results, Path(options["json_file"]))
+        regressions = []
+        if options.get("baseline"):
+            regressions = Bench.compare(
+                results, Path(options["baseline"]), options.get("tolerance", 10)
+            )
+        for line in regressions:
+            log.warning(f"Regression {line}")
+        Main._conclude(start_ts)
+        return all(res.ok for res in results) and not regressions
+
     @staticmethod
     def border(options: dict) -> bool:
         """Add border to the image file(s)
@@ -134,6 +214,31 @@ class Main:
         Main._conclude(start_ts)
         return ok
 
+    @staticmethod
+    def pipeline(options: dict) -> bool:
+        """Run the ordered steps on the image file(s), decode and encode once
+
+        Args:
+            options: input options dict
+
+        Returns:
+            bool: True - Success. False - Error
+        """
+        start_ts = Main._prepare(options)
+        in_path = Path(options["src_path"])
+        ok, steps = Pipeline.parse_steps(options.get("steps"))
+        if not ok:
+            log.error(steps)
+            return False
+        output = options.get("output")
+        out = Path(output) if output else REPLACE
+        if in_path.is_file():
+            ok, _ = Pipeline.run_1_image((in_path, out, steps))
+        else:
+            ok = Pipeline.run_all_in_dir(in_path, out, steps)
+        Main._conclude(start_ts)
+        return ok
+
     @staticmethod
     def remove_bg(options) -> bool:
         """Remove background (make background transparent)
@@ -243,12 +348,15 @@ class Main:
             log.error(f"Skip due to bad data {transparency=}")
             return False
         white = options.get("white", False)
+        tolerance = options.get("white_tolerance") or 0
         output = options.get("output")
         out = Path(output) if output else REPLACE
         if in_path.is_file():
-            args = (in_path, out, transparency, white)
+            args = (in_path, out, transparency, white, tolerance)
             ok, _ = Transparent.do_1_image_transparency(args)
         else:
-            ok = Transparent.all_images_transparency(in_path, out, transparency, white)
+            ok = Transparent.all_images_transparency(
+                in_path, out, transparency, white, tolerance
+            )
         Main._conclude(start_ts)
         return ok
@@ -0,0 +1,170 @@
+"""class Manifest: record the processed image files to skip the unchanged ones
+Copyright © 2025 John Liu
+"""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterable, Iterator
+from dataclasses import asdict
+from pathlib import Path
+from threading import Lock
+
+from loguru import logger as log
+
+from batch_img.const import MANIFEST, Conf
+
+
+class Manifest:
+    """Per-dir manifest file of {file name: [size, mtime_ns, hash, op key]}"""
+
+    def __init__(self, content_hash: bool = False):
+        self.content_hash = content_hash
+        self.skipped = 0
+        self._dirs = {}
+        self._dirty = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def op_key(func, task: tuple) -> str:
+        """Get the key of the operation and its params on an image file
+
+        Args:
+            func: per image function, e.g. Resize.resize_an_image
+            task: tuple of in_path, out_path, params...
+
+        Returns:
+            str: short hex digest
+        """
+        text = repr((func.__qualname__, str(task[1]), task[2:], asdict(Conf())))
+        return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+    @staticmethod
+    def hash_file(file: Path) -> str:
+        """Get the content hash of a file
+
+        Args:
+            file: file path
+
+        Returns:
+            str: hex digest
+        """
+        h = hashlib.blake2b(digest_size=16)
+        with open(file, "rb") as f:
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def fingerprint(self, file: Path) -> list:
+        """Get the fingerprint of a file
+
+        Args:
+            file: file path
+
+        Returns:
+            list: size, mtime_ns, content hash or ""
+        """
+        st = os.stat(file)
+        digest = Manifest.hash_file(file) if self.content_hash else ""
+        return [st.st_size, st.st_mtime_ns, digest]
+
+    def _entries(self, folder: Path) -> dict:
+        """Get the entries of a dir, load its manifest file once
+
+        Args:
+            folder: dir path
+
+        Returns:
+            dict
+        """
+        with self._lock:
+            if folder not in self._dirs:
+                entries = {}
+                m_file = folder / MANIFEST
+                if m_file.exists():
+                    try:
+                        with open(m_file, encoding="utf-8") as f:
+                            entries = json.load(f)
+                    except (OSError, json.JSONDecodeError) as e:
+                        log.warning(f"Ignore bad manifest {m_file}: {e}")
+                self._dirs[folder] = entries
+            return self._dirs[folder]
+
+    def is_done(self, file: Path, key: str) -> bool:
+        """Check if the file was processed by the same operation and params
+
+        Args:
+            file: image file path
+            key: operation key
+
+        Returns:
+            bool
+        """
+        entry = self._entries(file.parent).get(file.name)
+        if not entry or entry[3] != key:
+            return False
+        try:
+            st = os.stat(file)
+        except OSError:
+            return False
+        if st.st_size != entry[0]:
+            return False
+        if st.st_mtime_ns == entry[1]:
+            return True
+        # touched, but maybe not changed
+        return self.content_hash and Manifest.hash_file(file) == entry[2]
+
+    def pending(self, func, tasks: Iterable) -> Iterator:
+        """Filter out the tasks of the unchanged image files
+
+        Args:
+            func: per image function
+            tasks: tasks iterable
+
+        Returns:
+            Iterator: tasks to run
+        """
+        for task in tasks:
+            if self.is_done(task[0], Manifest.op_key(func, task)):
+                log.debug(f"Skip unchanged {task[0]}")
+                self.skipped += 1
+                continue
+            yield task
+
+    def record(self, func, task: tuple) -> None:
+        """Record a successfully processed image file
+
+        Args:
+            func: per image function
+            task: tuple of in_path, out_path, params...
+
+        Returns:
+            None
+        """
+        file = task[0]
+        try:
+            entry = [*self.fingerprint(file), Manifest.op_key(func, task)]
+        except OSError as e:
+            log.warning(f"Not record {file}: {e}")
+            return
+        entries = self._entries(file.parent)
+        with self._lock:
+            entries[file.name] = entry
+            self._dirty.add(file.parent)
+
+    def save(self) -> None:
+        """Write the changed manifest files atomically
+
+        Returns:
+            None
+        """
+        for folder in self._dirty:
+            m_file = folder / MANIFEST
+            tmp = m_file.with_name(f"{m_file.name}.{os.getpid()}.tmp")
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._dirs[folder], f, separators=(",", ":"))
+                os.replace(tmp, m_file)
+            except OSError as e:
+                log.warning(f"Error save manifest {m_file}: {e}")
+        self._dirty.clear()
@@ -2,7 +2,8 @@
 Copyright © 2025 John Liu
 """
 
-import os
+import struct
+import zlib
 from pathlib import Path
 
 import pillow_heif
@@ -10,15 +11,48 @@ from loguru import logger as log
 from PIL import Image
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import EXIF
+from batch_img.stats import STATS
 
 pillow_heif.register_heif_opener()
 
 
 class NoGps:
+    @staticmethod
+    def splice_exif(data: bytes, old: bytes, new: bytes, img_format: str):
+        """Replace the EXIF data in the image file bytes by the same length
+        new EXIF data. Copy the compressed image data through unchanged
+
+        Args:
+            data: image file bytes
+            old: EXIF data in the file
+            new: same length new EXIF data
+            img_format: image format str, e.g. "JPEG"
+
+        Returns:
+            bytes | None: new file bytes. None - not found it in place
+        """
+        tiff, new_tiff = old, new
+        if old.startswith(b"Exif\0\0"):
+            tiff, new_tiff = old[6:], new[6:]
+        pos = data.find(tiff)
+        if pos < 0 or data.find(tiff, pos + 1) >= 0 or len(tiff) != len(new_tiff):
+            return None
+        end = pos + len(tiff)
+        new_data = bytearray(data)
+        new_data[pos:end] = new_tiff
+        if img_format == "PNG":
+            # eXIf chunk: length, type, data, CRC of type + data
+            if data[pos - 8 : pos] != struct.pack(">I", len(tiff)) + b"eXIf":
+                return None
+            new_data[end : end + 4] = struct.pack(">I", zlib.crc32(b"eXIf" + new_tiff))
+        return bytes(new_data)
+
     @staticmethod
     def remove_1_image_gps(args: tuple) -> tuple:
-        """Remove GPS location info in an image file
+        """Remove GPS location info in an image file.
+        Blank the GPS in the EXIF data in the file bytes (JPEG APP1, PNG eXIf,
+        HEIF Exif item) without decoding the image. Fall back to re-encode
 
         Args:
             args: tuple of the below params:
@@ -36,20 +70,38 @@ class NoGps:
                     msg = f"Skip as no EXIF in {in_path}"
                     log.debug(msg)
                     return True, f"Skip as no EXIF in {in_path}"
-                removed, exif_bytes = Common.remove_exif_gps(img.info[EXIF])
+                exif_data = img.info[EXIF]
+                file = Common.set_out_file(in_path, out_path, "NoGPS")
+                with STATS.stage("exif"):
+                    blanked, new_exif = Common.blank_exif_gps(exif_data)
+                if blanked:
+                    with open(in_path, "rb") as f:
+                        data = f.read()
+                    new_data = NoGps.splice_exif(data, exif_data, new_exif, img.format)
+                    if new_data:
+                        file = Common.save_bytes(new_data, in_path, out_path, file)
+                        log.debug(f"Blanked GPS losslessly in {file}")
+                        return True, file
+                    log.debug(f"Not found EXIF in place. Re-encode {in_path}")
+                with STATS.stage("exif"):
+                    removed, exif_bytes = Common.remove_exif_gps(exif_data)
                 if removed:
-                    file = Common.set_out_file(in_path, out_path, "NoGPS")
-                    img.save(file, img.format, optimize=True, exif=exif_bytes)
+                    Common.load_image(img)
+                    file = Common.save_image(
+                        img,
+                        in_path,
+                        out_path,
+                        file,
+                        img.format,
+                        optimize=True,
+                        exif=exif_bytes,
+                    )
                 else:
                     msg = f"No 'GPS' in EXIF of {in_path}"
                     log.debug(msg)
                     return True, msg
 
             log.debug(f"Saved the no GPS info image to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -67,15 +119,18 @@ class NoGps:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = ((f, Common.mirror_out_path(in_path, f, out_path)) for f in image_files)
+        log.debug(f"Remove GPS info in image files in {in_path} ...")
+        # Mostly file I/O: the in-place GPS blanking parses a few KB of EXIF
+        # and copies the image bytes; only the fallback decodes and encodes
+        success_cnt, files_cnt = Common.executor_progress(
+            NoGps.remove_1_image_gps,
+            "Remove GPS in image files",
+            tasks,
+            gil_bound=False,
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Remove GPS info in {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            NoGps.remove_1_image_gps, "Remove GPS in image files", tasks
-        )
         log.info(f"\nSuccessfully removed GPS in {success_cnt}/{files_cnt} files")
         return True
@@ -0,0 +1,47 @@
+"""class Opts: run-wide options shared by the batch operations
+Copyright © 2025 John Liu
+"""
+
+from dataclasses import asdict, dataclass, fields
+
+from batch_img.const import AUTO, PERFECT, U2NET
+
+
+@dataclass
+class Opts:  # pylint: disable=too-many-instance-attributes
+    executor: str = AUTO
+    window: int = 0
+    workers: int = 0
+    recursive: bool = False
+    scan_threads: int = 1
+    incremental: bool = False
+    content_hash: bool = False
+    jpeg_lossless: str = PERFECT
+    model: str = U2NET
+    model_dir: str = ""
+    max_memory: int = 0
+    timings: str = ""
+
+    def load(self, options: dict) -> None:
+        """Reset to the defaults, then take the known keys in the options
+
+        Args:
+            options: input options dict
+
+        Returns:
+            None
+        """
+        for field in fields(self):
+            val = options.get(field.name)
+            setattr(self, field.name, field.default if val is None else val)
+
+    def to_dict(self) -> dict:
+        """Get the options as a dict, e.g. to pass to the worker processes
+
+        Returns:
+            dict
+        """
+        return asdict(self)
+
+
+OPTS = Opts()
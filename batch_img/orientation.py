@@ -3,7 +3,10 @@ Copyright © 2025 John Liu
 """
 
 import os
+from io import BytesIO
 from pathlib import Path
+from threading import local
+from time import perf_counter
 
 import cv2
 import numpy as np
@@ -14,6 +17,7 @@ from PIL import Image
 
 from batch_img.common import Common
 from batch_img.const import EXIF
+from batch_img.stats import STATS
 
 pillow_heif.register_heif_opener()
 
@@ -33,7 +37,24 @@ EXIF_CW_ANGLE = {
     7: 90,
     8: 90,
 }
+# The EXIF orientation values a camera writes for a turned, not mirrored, image
+EXIF_TURNED = {3, 6, 8}
 FLOOR_THRESHOLD = 0.73
+# Min side length of the embedded thumbnail to score the floor edge, and its
+# higher threshold as the scores of a small image are noisier
+THUMB_SIZE = 160
+THUMB_THRESHOLD = 0.85
+# Max side length of the working image to score the floor edge
+EDGE_WORK_SIZE = 1536
+# Max side lengths of the working images to detect faces, coarse to fine.
+# The min face size is 1/FACE_MIN_DIV of the short side: the smaller hits
+# are mostly false
+FACE_WORK_SIZES = (800, 2048)
+FACE_MIN_DIV = 40
+# Seconds to spend on detecting faces in an image before giving up
+FACE_TIME_BUDGET = 5.0
+# The face cascade loaded in this thread
+_FACE = local()
 SKY_THRESHOLD = 0.31
 
 
@@ -94,54 +115,251 @@ class Orientation:
             return False
 
     @staticmethod
-    def get_floor_score(img) -> float:
-        """Get the floor score for every 90 degree rotated image
+    def get_floor_scores(img) -> dict:
+        """Get the floor scores of the 4 clockwise angles by one pass of gray and
+        edges. A 90 degree rotation only changes which strips are top and bottom
 
         Args:
             img: OpenCV img
 
         Returns:
-            float:
+            dict: clockwise angle: confidence as float
         """
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        h = gray.shape[0]
-        top, bottom = gray[: h // 3], gray[-h // 3 :]
-
         edges = cv2.Canny(gray, 50, 150)
-        top_e, bot_e = edges[: h // 3], edges[-h // 3 :]
-        edge_diff = np.mean(bot_e) - np.mean(top_e)
-        brightness_diff = np.mean(bottom) - np.mean(top)
+        h, w = gray.shape
+        # The top 1/3 and bottom ceil 1/3 strips of the rotated image
+        strips = {
+            0: (np.s_[: h // 3], np.s_[h - (h + 2) // 3 :]),
+            90: (np.s_[:, : w // 3], np.s_[:, w - (w + 2) // 3 :]),
+            180: (np.s_[h - h // 3 :], np.s_[: (h + 2) // 3]),
+            270: (np.s_[:, w - w // 3 :], np.s_[:, : (w + 2) // 3]),
+        }
+        scores = {}
+        for angle_cw, (top, bottom) in strips.items():
+            edge_diff = np.mean(edges[bottom]) - np.mean(edges[top])
+            brightness_diff = np.mean(gray[bottom]) - np.mean(gray[top])
+            score = edge_diff + brightness_diff
+            confidence = 1 / (1 + np.exp(-score / 20))  # by sigmoid
+            scores[angle_cw] = round(float(confidence), 3)
+        return scores
+
+    @staticmethod
+    def get_floor_score(img) -> float:
+        """Get the floor score of the image as is
+
+        Args:
+            img: OpenCV img
 
-        score = edge_diff + brightness_diff
-        confidence = 1 / (1 + np.exp(-score / 20))  # by sigmoid
-        return round(float(confidence), 3)
+        Returns:
+            float:
+        """
+        return Orientation.get_floor_scores(img)[0]
 
-    def detect_floor_by_edge(self, file: Path) -> tuple:
-        """Get image orientation by floor edge
+    @staticmethod
+    def get_best_floor_angle(opencv_img, threshold: float) -> tuple:
+        """Get the angle of the best floor score, if not less than the threshold
 
         Args:
-            file: image file path
+            opencv_img: OpenCV img
+            threshold: min confidence
 
         Returns:
-            tuple: clockwise angle to correct, confidence as float
+            tuple: clockwise angle to correct or -1, confidence as float
         """
-        scores = {}
-        with Image.open(file) as safe_img:
-            opencv_img = np.array(safe_img)
-            if opencv_img is None:
-                raise ValueError(f"Failed to load {file}")
-        for angle_cw in (0, 90, 180, 270):
-            img = self._rotate_image(opencv_img, angle_cw)
-            scores[angle_cw] = self.get_floor_score(img)
+        scores = Orientation.get_floor_scores(opencv_img)
         log.debug(f"{scores=}")
         best_angle = max(scores, key=scores.get)
         score = scores[best_angle]
         log.debug(f"{best_angle=}, {score=}")
-        if score < FLOOR_THRESHOLD:
-            log.warning(f"{score=} is less than {FLOOR_THRESHOLD=}")
+        if score < threshold:
+            log.warning(f"{score=} is less than {threshold=}")
             return -1, score
         return best_angle, score
 
+    @staticmethod
+    def detect_floor_by_edge(file: Path, work_size: int = EDGE_WORK_SIZE) -> tuple:
+        """Get image orientation by floor edge, on a downscaled working image
+
+        Args:
+            file: image file path
+            work_size: max side length of the working image. 0 - full size
+
+        Returns:
+            tuple: clockwise angle to correct, confidence as float
+        """
+        with Image.open(file) as safe_img:
+            if work_size:
+                safe_img.thumbnail((work_size, work_size))
+            opencv_img = np.array(safe_img.convert("RGB"))
+        return Orientation.get_best_floor_angle(opencv_img, FLOOR_THRESHOLD)
+
+    @staticmethod
+    def detect_floor_in_img(img: Image.Image, work_size: int = EDGE_WORK_SIZE) -> tuple:
+        """Get the orientation of the image in memory by floor edge, on a
+        downscaled working copy
+
+        Args:
+            img: image
+            work_size: max side length of the working image. 0 - full size
+
+        Returns:
+            tuple: clockwise angle to correct, confidence as float
+        """
+        work_img = img.convert("RGB")
+        if work_size:
+            work_img.thumbnail((work_size, work_size))
+        return Orientation.get_best_floor_angle(np.array(work_img), FLOOR_THRESHOLD)
+
+    @staticmethod
+    def get_exif_thumbnail(img: Image.Image) -> Image.Image | None:
+        """Get the EXIF thumbnail of the image
+
+        Args:
+            img: image
+
+        Returns:
+            Image.Image: RGB thumbnail or None
+        """
+        if EXIF not in img.info:
+            return None
+        data = piexif.load(img.info[EXIF]).get("thumbnail")
+        if not data:
+            return None
+        with Image.open(BytesIO(data)) as t_img:
+            return t_img.convert("RGB")
+
+    @staticmethod
+    def get_thumbnail(file: Path) -> Image.Image | None:
+        """Get the embedded thumbnail: the HEIF thumbnail image or EXIF thumbnail
+
+        Args:
+            file: image file path
+
+        Returns:
+            Image.Image: RGB thumbnail or None
+        """
+        with Image.open(file) as img:
+            if img.format != "HEIF":
+                return Orientation.get_exif_thumbnail(img)
+            # The HEIF plugin draft() selects an embedded thumbnail
+            if img.draft("RGB", (THUMB_SIZE, THUMB_SIZE)):
+                return img.convert("RGB")
+        return None
+
+    @staticmethod
+    def detect_floor_in_thumbnail(thumb: Image.Image | None, size: tuple) -> tuple:
+        """Get image orientation by floor edge on the embedded thumbnail.
+        Skip a stale one, e.g. landscape of a portrait image edited elsewhere
+
+        Args:
+            thumb: RGB thumbnail or None
+            size: image size
+
+        Returns:
+            tuple: clockwise angle to correct or -1, confidence as float
+        """
+        width, height = size
+        if not thumb or (thumb.width > thumb.height) != (width > height):
+            return -1, 0.0
+        return Orientation.get_best_floor_angle(np.array(thumb), THUMB_THRESHOLD)
+
+    @staticmethod
+    def get_exif_cw_angle(o_val: int) -> int:
+        """Get the clockwise angle to undo the EXIF orientation of a turned image
+
+        Args:
+            o_val: EXIF orientation value int
+
+        Returns:
+            int: clockwise angle: 90, 180, 270 or -1
+        """
+        if o_val not in EXIF_TURNED:
+            return -1
+        # EXIF_CW_ANGLE is how the image is turned
+        return (360 - EXIF_CW_ANGLE[o_val]) % 360
+
+    @staticmethod
+    def run_tiers(tiers: list) -> tuple:
+        """Run the orientation tiers in order, and stop at the first result
+
+        Args:
+            tiers: list of (tier name, function returns angle or -1)
+
+        Returns:
+            tuple: clockwise angle: 0, 90, 180, 270 or -1, tier name
+        """
+        for tier, get_angle in tiers:
+            start = perf_counter()
+            cw_angle = get_angle()
+            STATS.add(f"Orientation {tier}", perf_counter() - start, cw_angle != -1)
+            if cw_angle != -1:
+                log.debug(f"By {tier}: {cw_angle=}")
+                return cw_angle, tier
+        return -1, ""
+
+    @staticmethod
+    def resolve_cw_angle(file: Path) -> tuple:
+        """Resolve the clockwise angle to correct the image orientation by the
+        tiers, cheap first. Stop at the first tier with a result:
+        * exif: the Orientation tag of a turned image. Not tag 1, as an image
+          turned by an editor often keeps it
+        * thumbnail: floor edge on the embedded thumbnail
+        * reduced: floor edge on the reduced size decode
+        * full: floor edge on the full size, if larger
+        * face: face detection
+
+        Args:
+            file: image file path
+
+        Returns:
+            tuple: clockwise angle: 0, 90, 180, 270 or -1, tier name
+        """
+        with Image.open(file) as img:
+            o_val = img.getexif().get(piexif.ImageIFD.Orientation, 1)
+            size = img.size
+        tiers = [
+            ("exif", lambda: Orientation.get_exif_cw_angle(o_val)),
+            (
+                "thumbnail",
+                lambda: Orientation.detect_floor_in_thumbnail(
+                    Orientation.get_thumbnail(file), size
+                )[0],
+            ),
+            ("reduced", lambda: Orientation.detect_floor_by_edge(file)[0]),
+        ]
+        if max(size) > EDGE_WORK_SIZE:
+            tiers.append(("full", lambda: Orientation.detect_floor_by_edge(file, 0)[0]))
+        tiers.append(("face", lambda: Orientation.get_cw_angle_by_face(file)))
+        return Orientation.run_tiers(tiers)
+
+    @staticmethod
+    def resolve_img_cw_angle(img: Image.Image, o_val: int = 1) -> tuple:
+        """Resolve the clockwise angle to correct the orientation of the image in
+        memory, e.g. decoded and resized, by the tiers of resolve_cw_angle()
+
+        Args:
+            img: image
+            o_val: EXIF orientation value int
+
+        Returns:
+            tuple: clockwise angle: 0, 90, 180, 270 or -1, tier name
+        """
+        tiers = [
+            ("exif", lambda: Orientation.get_exif_cw_angle(o_val)),
+            (
+                "thumbnail",
+                lambda: Orientation.detect_floor_in_thumbnail(
+                    Orientation.get_exif_thumbnail(img), img.size
+                )[0],
+            ),
+            ("reduced", lambda: Orientation.detect_floor_in_img(img)[0]),
+        ]
+        if max(img.size) > EDGE_WORK_SIZE:
+            tiers.append(("full", lambda: Orientation.detect_floor_in_img(img, 0)[0]))
+        tiers.append(("face", lambda: Orientation.get_img_cw_angle_by_face(img, o_val)))
+        return Orientation.run_tiers(tiers)
+
     @staticmethod
     def _rotate_image(img, angle: int):
         """Helper to rotate image by the clock wise angle degree
@@ -161,34 +379,89 @@ class Orientation:
             return cv2.rotate(img, cv2.ROTATE_90_COUNTERCLOCKWISE)
         return img
 
-    def get_cw_angle_by_face(self, file: Path) -> int:
+    @staticmethod
+    def get_face_cascade() -> cv2.CascadeClassifier:
+        """Get the Haar Cascades frontal face classifier. Parse its XML once per
+        thread, then reuse it
+
+        Returns:
+            cv2.CascadeClassifier
+        """
+        if not hasattr(_FACE, "cascade"):
+            _FACE.cascade = cv2.CascadeClassifier(
+                cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+            )
+        return _FACE.cascade
+
+    @staticmethod
+    def get_cw_angle_by_face(file: Path, time_budget: float = FACE_TIME_BUDGET) -> int:
         """Get image orientation by face using Haar Cascades:
         * Fastest but least accurate
         * Works best with frontal faces
         * May produce false positives
 
+        Detect on a downscaled gray image, then a larger one if no face. Try the
+        EXIF orientation angle first, then 0, 90, 180, 270 and stop at the
+        first angle with a face
+
         Args:
             file: image file path
+            time_budget: seconds of the detection to give up after
 
         Returns:
             int: clockwise angle: 0, 90, 180, 270, or -1
         """
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        )
         with Image.open(file) as safe_img:
-            opencv_img = np.array(safe_img)
-            if opencv_img is None:
-                raise ValueError(f"Failed to load {file}")
-            for angle_cw in (0, 90, 180, 270):
-                img = self._rotate_image(opencv_img, angle_cw)
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            o_val = safe_img.getexif().get(piexif.ImageIFD.Orientation, 1)
+            cw_angle = Orientation.get_img_cw_angle_by_face(
+                safe_img, o_val, time_budget
+            )
+        if cw_angle == -1:
+            log.warning(f"Found no face in {file}")
+        return cw_angle
+
+    @staticmethod
+    def get_img_cw_angle_by_face(
+        img: Image.Image, o_val: int = 1, time_budget: float = FACE_TIME_BUDGET
+    ) -> int:
+        """Get the orientation of the image in memory by face. See
+        get_cw_angle_by_face()
+
+        Args:
+            img: image
+            o_val: EXIF orientation value int
+            time_budget: seconds of the detection to give up after
+
+        Returns:
+            int: clockwise angle: 0, 90, 180, 270, or -1
+        """
+        face_cascade = Orientation.get_face_cascade()
+        full_gray = cv2.cvtColor(np.array(img.convert("RGB")), cv2.COLOR_BGR2GRAY)
+        start = perf_counter()
+        # EXIF_CW_ANGLE is how the image is turned. Try the angle to undo it
+        prior = (360 - EXIF_CW_ANGLE.get(o_val, 0)) % 360
+        for work_size in FACE_WORK_SIZES:
+            gray = full_gray
+            ratio = work_size / max(full_gray.shape)
+            if ratio < 1:
+                gray = cv2.resize(
+                    full_gray, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA
+                )
+            min_len = min(gray.shape) // FACE_MIN_DIV
+            for angle_cw in dict.fromkeys((prior, 0, 90, 180, 270)):
+                if perf_counter() - start > time_budget:
+                    log.warning(f"Quit face detection over {time_budget=}s")
+                    return -1
                 faces = face_cascade.detectMultiScale(
-                    gray, scaleFactor=1.2, minNeighbors=6
+                    Orientation._rotate_image(gray, angle_cw),
+                    scaleFactor=1.2,
+                    minNeighbors=6,
+                    minSize=(min_len, min_len),
                 )
                 if len(faces) > 0:
                     return angle_cw
-        log.warning(f"Found no face in {file}")
+            if ratio >= 1:
+                break
         return -1
 
     @staticmethod
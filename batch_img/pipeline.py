@@ -0,0 +1,281 @@
+"""class Pipeline: run the steps on one in-memory image per file, write once
+Copyright © 2025 John Liu
+"""
+
+from pathlib import Path
+
+import piexif
+import pillow_heif
+from loguru import logger as log
+from PIL import Image
+
+from batch_img.border import Border
+from batch_img.common import Common
+from batch_img.const import EXIF, Conf
+from batch_img.do_effect import DoEffect
+from batch_img.effect import EFFECTS
+from batch_img.orientation import Orientation
+from batch_img.resize import Resize
+from batch_img.rotate import Rotate
+from batch_img.stats import STATS
+from batch_img.transparent import Transparent
+
+pillow_heif.register_heif_opener()
+
+# Step names are the same as the sub-commands, except auto-rotate
+AUTO_ROTATE = "auto-rotate"
+BORDER = "border"
+DO_EFFECT = "do-effect"
+REMOVE_GPS = "remove-gps"
+RESIZE = "resize"
+ROTATE = "rotate"
+TRANSPARENT = "transparent"
+STEPS_HELP = (
+    f"{RESIZE}:LENGTH, {ROTATE}:90|180|270, {AUTO_ROTATE}, {BORDER}:WIDTH[,COLOR],"
+    f" {REMOVE_GPS}, {TRANSPARENT}:0-255[,white[,TOLERANCE]], {DO_EFFECT}:"
+    + "|".join(EFFECTS)
+)
+
+
+class Pipeline:
+    @staticmethod
+    def parse_step(text: str) -> tuple:
+        """Parse a step str, e.g. "resize:1024" or "border:5,black"
+
+        Args:
+            text: step str
+
+        Returns:
+            tuple: step name, args tuple
+
+        Raises:
+            ValueError: bad step name or args
+        """
+        name, _, arg = text.strip().partition(":")
+        args = [a.strip() for a in arg.split(",")] if arg else []
+        if name == RESIZE and len(args) == 1 and int(args[0]) > 0:
+            return name, (int(args[0]),)
+        if name == ROTATE and len(args) == 1 and int(args[0]) in {90, 180, 270}:
+            return name, (int(args[0]),)
+        if name == BORDER and len(args) in {1, 2} and int(args[0]) > 0:
+            bd_color = args[1] if len(args) == 2 else Conf.bd_color
+            return name, (int(args[0]), bd_color)
+        if name in {AUTO_ROTATE, REMOVE_GPS} and not args:
+            return name, ()
+        if name == TRANSPARENT and 0 < len(args) < 4 and 0 <= int(args[0]) <= 255:
+            white = len(args) > 1 and args[1] in {"w", "white"}
+            if len(args) > 1 and not white:
+                raise ValueError(f"bad option {args[1]!r}")
+            tolerance = int(args[2]) if len(args) == 3 else 0
+            if not 0 <= tolerance <= 255:
+                raise ValueError(f"bad tolerance {tolerance}")
+            return name, (int(args[0]), white, tolerance)
+        if name == DO_EFFECT and len(args) == 1 and args[0] in EFFECTS:
+            return name, (args[0],)
+        raise ValueError("bad name or args")
+
+    @staticmethod
+    def parse_steps(texts: list | tuple) -> tuple:
+        """Parse the ordered step strs
+
+        Args:
+            texts: step strs
+
+        Returns:
+            tuple: bool, list of (step name, args) or error message str
+        """
+        if not texts:
+            return False, f"No steps. Use {STEPS_HELP}"
+        steps = []
+        for text in texts:
+            try:
+                steps.append(Pipeline.parse_step(text))
+            except ValueError as e:
+                return False, f"Bad step {text!r}: {e}. Use {STEPS_HELP}"
+        return True, steps
+
+    @staticmethod
+    def get_extra(name: str, args: tuple) -> str:
+        """Get the output file name extra of a step, the same as its sub-command
+
+        Args:
+            name: step name
+            args: step args
+
+        Returns:
+            str
+        """
+        if name == RESIZE:
+            return f"{args[0]}"
+        if name in {ROTATE, AUTO_ROTATE}:
+            # auto-rotate args is the resolved angle. 0 or none - not rotated
+            return f"{args[0]}cw" if args and args[0] > 0 else ""
+        if name == BORDER:
+            return f"bw{args[0]}"
+        if name == REMOVE_GPS:
+            return "NoGPS"
+        if name == TRANSPARENT:
+            return Transparent.get_extra(*args)
+        return args[0]
+
+    @staticmethod
+    def resolve_cw_angle(
+        img: Image.Image, in_path: Path, exif_dict: dict | None
+    ) -> int:
+        """Resolve the clockwise angle to correct the orientation of the image in
+        memory, e.g. the resized one
+
+        Args:
+            img: image
+            in_path: image file path
+            exif_dict: EXIF dict or None
+
+        Returns:
+            int: clockwise angle: 0, 90, 180, 270. 0 - not found
+        """
+        o_val = (exif_dict or {}).get("0th", {}).get(piexif.ImageIFD.Orientation, 1)
+        cw_angle, _ = Orientation.resolve_img_cw_angle(img, o_val)
+        if cw_angle == -1:
+            log.warning(f"Found no orientation in {in_path.name=}. Skip.")
+            return 0
+        return cw_angle
+
+    @staticmethod
+    def apply_steps(img: Image.Image, in_path: Path, steps: list) -> tuple:
+        """Run the steps on the image in memory
+
+        Args:
+            img: opened image
+            in_path: image file path
+            steps: list of (step name, args)
+
+        Returns:
+            tuple: new image, EXIF dict or None, list of the steps extras
+        """
+        with STATS.stage("exif"):
+            exif_dict = piexif.load(img.info[EXIF]) if EXIF in img.info else None
+        if not steps or steps[0][0] != RESIZE:
+            # The resize step decodes after the JPEG draft
+            Common.load_image(img)
+        new_img = img
+        extras = []
+        for name, step_args in steps:
+            log.debug(f"Run {name}{step_args} on {in_path.name}")
+            args = step_args
+            if name == AUTO_ROTATE:
+                # Resolve the angle on the image so far, e.g. the resized one
+                with STATS.stage("orientation"):
+                    args = (Pipeline.resolve_cw_angle(new_img, in_path, exif_dict),)
+            if name == RESIZE:
+                new_img = Resize.resize_img(new_img, *args)
+            elif name in {ROTATE, AUTO_ROTATE}:
+                if args[0] > 0:
+                    new_img = Rotate.rotate_img(new_img, *args)
+                    exif_dict = exif_dict or {"0th": {}, "Exif": {}}
+                    exif_dict["0th"][piexif.ImageIFD.Orientation] = 1
+            elif name == BORDER:
+                new_img = Border.border_img(new_img, *args)
+            elif name == REMOVE_GPS:
+                if exif_dict and exif_dict.get("GPS"):
+                    exif_dict.pop("GPS")
+            elif name == TRANSPARENT:
+                new_img = Transparent.transparent_img(new_img, *args)
+            elif name == DO_EFFECT:
+                new_img = DoEffect.effect_img(new_img, in_path, *args)
+            extras.append(Pipeline.get_extra(name, args))
+        return new_img, exif_dict, extras
+
+    @staticmethod
+    def process_1_image(
+        in_path: Path, out_path: Path | str, steps: list, extra: str = ""
+    ) -> tuple:
+        """Decode an image file once, run the steps on it, then encode once
+
+        Args:
+            in_path: input file path
+            out_path: output dir path or REPLACE
+            steps: list of (step name, args)
+            extra: output file name extra, followed by the auto-rotate extra.
+                Default: the steps extras
+
+        Returns:
+            tuple: bool, output file path
+        """
+        try:
+            with Image.open(in_path) as img:
+                new_img, exif_dict, extras = Pipeline.apply_steps(img, in_path, steps)
+                if extra:
+                    extras = [extra] + [
+                        x
+                        for (n, _), x in zip(steps, extras, strict=True)
+                        if n == AUTO_ROTATE
+                    ]
+                extra = "_".join(x for x in extras if x)
+                file = Common.set_out_file(in_path, out_path, extra)
+                i_format = img.format
+                if i_format == "JPEG" and new_img.mode == "RGBA":
+                    # JPEG does not support transparency
+                    i_format = "PNG"
+                    file = Path(f"{file.parent}/{file.stem}.png")
+                    log.debug(f"Revised {file=}")
+                params = {"optimize": True}
+                if exif_dict:
+                    with STATS.stage("exif"):
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    new_img, in_path, out_path, file, i_format, **params
+                )
+            log.debug(f"Saved the pipeline processed image to {file}")
+            return True, file
+        except (AttributeError, FileNotFoundError, ValueError) as e:
+            log.error(e)
+            return False, f"{in_path}:\n{e}"
+
+    @staticmethod
+    def run_1_image(args: tuple) -> tuple:
+        """Run the pipeline on an image file
+
+        Args:
+            args: tuple of the below params:
+            in_path: input file path
+            out_path: output dir path or REPLACE
+            steps: list of (step name, args)
+
+        Returns:
+            tuple: bool, output file path
+        """
+        in_path, out_path, steps = args
+        Common.set_log_by_process()
+        return Pipeline.process_1_image(in_path, out_path, steps)
+
+    @staticmethod
+    def run_all_in_dir(in_path: Path, out_path: Path | str, steps: list) -> bool:
+        """Run the pipeline on all image files in the given dir
+
+        Args:
+            in_path: input dir path
+            out_path: output dir path or REPLACE
+            steps: list of (step name, args)
+
+        Returns:
+            bool: True - Success. False - Error
+        """
+        image_files = Common.prepare_all_files(in_path, out_path)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), steps)
+            for f in image_files
+        )
+        log.debug(f"Run pipeline on image files in {in_path} ...")
+        # All steps are decode, whole-image Pillow / OpenCV kernels and encode,
+        # which release the GIL
+        success_cnt, files_cnt = Common.executor_progress(
+            Pipeline.run_1_image,
+            "Run pipeline on image files",
+            tasks,
+            gil_bound=False,
+        )
+        if files_cnt == 0:
+            log.error(f"No image files at {in_path}")
+            return False
+        log.info(f"\nPipeline processed {success_cnt}/{files_cnt} files")
+        return True
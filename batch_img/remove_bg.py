@@ -4,20 +4,48 @@ Copyright © 2025 John Liu
 
 import os
 from pathlib import Path
+from threading import Lock
 
 import piexif
 import pillow_heif
 from loguru import logger as log
 from PIL import Image
-from rembg import remove
+from rembg import new_session, remove
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import EXIF
+from batch_img.opts import OPTS
+from batch_img.stats import STATS
 
 pillow_heif.register_heif_opener()
 
+# The model sessions loaded in this process, shared by its threads
+SESSIONS = {}
+SESSIONS_LOCK = Lock()
+
 
 class RemoveBg:
+    @staticmethod
+    def get_session(model: str, model_dir: str = ""):
+        """Get the model session. Load it once per process, then reuse it
+        for all the image files. onnxruntime runs a session from many threads
+
+        Args:
+            model: rembg model name, e.g. u2net
+            model_dir: local dir of the model files. Default: rembg home dir
+
+        Returns:
+            BaseSession: rembg session
+        """
+        key = (model, model_dir)
+        with SESSIONS_LOCK:
+            if key not in SESSIONS:
+                if model_dir:
+                    os.environ["U2NET_HOME"] = str(Path(model_dir).expanduser())
+                log.info(f"Load the {model} model to identify the background...")
+                SESSIONS[key] = new_session(model)
+            return SESSIONS[key]
+
     @staticmethod
     def remove_bg_image(args: tuple) -> tuple:
         """Remove background (make background transparent) in an image file
@@ -34,25 +62,25 @@ class RemoveBg:
         Common.set_log_by_process()
         try:
             with Image.open(in_path) as img:
-                a_img = img.convert("RGBA")
-                a_img = remove(a_img)  # remove background
+                Common.load_image(img)
+                session = RemoveBg.get_session(OPTS.model, OPTS.model_dir)
+                with STATS.stage("remove-bg"):
+                    a_img = remove(img.convert("RGBA"), session=session)
                 file = Common.set_out_file(in_path, out_path, "NoBg")
                 i_format = img.format
                 if i_format == "JPEG":
                     i_format = "PNG"
                     file = Path(f"{file.parent}/{file.stem}.png")
                     log.debug(f"Revised {file=}")
+                params = {"optimize": True}
                 if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                    exif_bytes = piexif.dump(exif_dict)
-                    a_img.save(file, format=i_format, optimize=True, exif=exif_bytes)
-                else:
-                    a_img.save(file, format=i_format, optimize=True)
+                    with STATS.stage("exif"):
+                        exif_dict = piexif.load(img.info[EXIF])
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    a_img, in_path, out_path, file, i_format, **params
+                )
             log.debug(f"Saved the new image to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -70,15 +98,15 @@ class RemoveBg:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = ((f, Common.mirror_out_path(in_path, f, out_path)) for f in image_files)
+        log.debug(f"Remove background on image files in {in_path} ...")
+        # onnxruntime inference releases the GIL, and the threads share one
+        # model session, while each process loads its own copy
+        success_cnt, files_cnt = Common.executor_progress(
+            RemoveBg.remove_bg_image, "Remove background", tasks, gil_bound=False
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Remove background on {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            RemoveBg.remove_bg_image, "Remove background", tasks
-        )
         log.info(f"\nDone - removed background on {success_cnt}/{files_cnt} files")
         return True
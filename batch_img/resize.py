@@ -2,7 +2,7 @@
 Copyright © 2025 John Liu
 """
 
-import os
+from math import ceil
 from pathlib import Path
 
 import piexif
@@ -11,12 +11,52 @@ from loguru import logger as log
 from PIL import Image
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import DRAFT_GAP, EXIF
+from batch_img.stats import STATS
 
 pillow_heif.register_heif_opener()
 
 
 class Resize:
+    @staticmethod
+    def draft_jpeg(img: Image.Image, new_size: tuple) -> None:
+        """Let libjpeg decode a not loaded JPEG image at 1/2, 1/4 or 1/8 scale,
+        the largest reduction still >= DRAFT_GAP x new_size. Other images no-op
+
+        Args:
+            img: opened image
+            new_size: target width, height
+
+        Returns:
+            None
+        """
+        if img.format != "JPEG":
+            return
+        width, height = img.size
+        d_size = tuple(ceil(x * DRAFT_GAP) for x in new_size)
+        img.draft(img.mode, d_size)
+        if img.size != (width, height):
+            log.debug(f"Draft decode {width}x{height} at {img.size} for {new_size}")
+
+    @staticmethod
+    def resize_img(img: Image.Image, length: int) -> Image.Image:
+        """Resize the image in memory on original aspect ratio
+
+        Args:
+            img: image
+            length: max pixels length (width or height)
+
+        Returns:
+            Image.Image: resized image
+        """
+        width, height = img.size
+        new_size = Common.calculate_new_size(width, height, length)
+        # DCT-domain reduce in decode, then LANCZOS for the high quality
+        Resize.draft_jpeg(img, new_size)
+        Common.load_image(img)
+        with STATS.stage("resize"):
+            return img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3)
+
     @staticmethod
     def resize_an_image(args: tuple) -> tuple:
         """Resize an image file and save to the output dir
@@ -34,25 +74,21 @@ class Resize:
         Common.set_log_by_process()
         try:
             with Image.open(in_path) as img:
-                width, height = img.size
-                new_size = Common.calculate_new_size(width, height, length)
-                new_img = img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3)
+                new_img = Resize.resize_img(img, length)
 
                 # thumbnail() keep the aspect ratio, but shrink only, not enlarge
                 # img.thumbnail((length, length), Image.Resampling.LANCZOS)
 
                 file = Common.set_out_file(in_path, out_path, f"{length}")
+                params = {"optimize": True}
                 if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                    exif_bytes = piexif.dump(exif_dict)
-                    new_img.save(file, img.format, optimize=True, exif=exif_bytes)
-                else:
-                    new_img.save(file, img.format, optimize=True)
+                    with STATS.stage("exif"):
+                        exif_dict = piexif.load(img.info[EXIF])
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    new_img, in_path, out_path, file, img.format, **params
+                )
             log.debug(f"Saved resized image to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -73,15 +109,18 @@ class Resize:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, length) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), length)
+            for f in image_files
+        )
+        log.debug(f"Resize image files in {in_path} ...")
+        # Decode, LANCZOS resize and encode release the GIL; the piexif
+        # load / dump is small next to them
+        success_cnt, files_cnt = Common.executor_progress(
+            Resize.resize_an_image, "Resize image files", tasks, gil_bound=False
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Resize {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            Resize.resize_an_image, "Resize image files", tasks
-        )
         log.info(f"\nSuccessfully resized {success_cnt}/{files_cnt} files")
         return True
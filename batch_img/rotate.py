@@ -2,8 +2,11 @@
 Copyright © 2025 John Liu
 """
 
-import os
+import io
+import shutil
+import subprocess
 from pathlib import Path
+from shlex import quote
 
 import piexif
 import pillow_heif
@@ -11,12 +14,94 @@ from loguru import logger as log
 from PIL import Image
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import EXIF, OFF, PERFECT, TRIM
+from batch_img.opts import OPTS
+from batch_img.stats import STATS
 
 pillow_heif.register_heif_opener()
+JPEGTRAN = shutil.which("jpegtran")
 
 
 class Rotate:
+    @staticmethod
+    def rotate_img(img: Image.Image, angle_cw: int) -> Image.Image:
+        """Rotate the image in memory to clockwise angle by lossless transpose
+
+        Args:
+            img: image
+            angle_cw: rotation angle clockwise: 90, 180, or 270
+
+        Returns:
+            Image.Image: rotated image
+        """
+        # img.rotate() for any angle (slower & slight quality loss)
+        method = {90: Image.ROTATE_270, 180: Image.ROTATE_180, 270: Image.ROTATE_90}
+        if angle_cw not in method:
+            return img
+        with STATS.stage("rotate"):
+            return img.transpose(method[angle_cw])
+
+    @staticmethod
+    def is_mcu_aligned(img: Image.Image, angle_cw: int) -> bool:
+        """Check if a JPEG has no partial MCU at the edges moved by the rotation.
+        jpegtran can't move a partial MCU: the bottom edge for 90 (it becomes
+        the left), the right edge for 270, and both for 180
+
+        Args:
+            img: opened JPEG image
+            angle_cw: rotation angle clockwise: 90, 180, or 270
+
+        Returns:
+            bool
+        """
+        width, height = img.size
+        mcu_w = 8 * max(layer[1] for layer in img.layer)
+        mcu_h = 8 * max(layer[2] for layer in img.layer)
+        if angle_cw == 90:
+            return height % mcu_h == 0
+        if angle_cw == 270:
+            return width % mcu_w == 0
+        return width % mcu_w == 0 and height % mcu_h == 0
+
+    @staticmethod
+    def rotate_jpeg_lossless(
+        img: Image.Image, in_path: Path, file: Path, angle_cw: int, exif_bytes: bytes
+    ):
+        """Rotate a JPEG file losslessly by jpegtran on the DCT coefficients
+
+        Args:
+            img: opened JPEG image of the input file
+            in_path: input file path
+            file: output file path
+            angle_cw: rotation angle clockwise: 90, 180, or 270
+            exif_bytes: EXIF data to set in the output
+
+        Returns:
+            bytes | None: rotated JPEG file bytes. None - use the pixel path
+        """
+        if OPTS.jpeg_lossless == OFF or not JPEGTRAN:
+            return None
+        if OPTS.jpeg_lossless != TRIM and not Rotate.is_mcu_aligned(img, angle_cw):
+            log.debug(f"Partial MCU edge in {in_path}. Not {PERFECT} lossless")
+            return None
+        mode = "-trim" if OPTS.jpeg_lossless == TRIM else "-perfect"
+        jt_file = file.with_name(f"{file.stem}_jt{file.suffix}")
+        cmd = (
+            f"{quote(JPEGTRAN)} -copy all -rotate {angle_cw} {mode}"
+            f" -outfile {quote(str(jt_file))} {quote(str(in_path))}"
+        )
+        try:
+            Common.run_cmd(cmd)
+            # Replace the APP1 segment only, the scan data is untouched
+            buf = io.BytesIO()
+            piexif.insert(exif_bytes, jt_file.read_bytes(), buf)
+            return buf.getvalue()
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            log.warning(f"jpegtran failed on {in_path}: {e}. Use the pixel path")
+            return None
+        finally:
+            jt_file.unlink(missing_ok=True)
+
     @staticmethod
     def rotate_1_image(args: tuple) -> tuple:
         """Rotate an image file and save to the output dir
@@ -39,28 +124,35 @@ class Rotate:
             return False, f"Bad {angle_cw=}. Only allow 90, 180, 270"
         try:
             with Image.open(in_path) as img:
-                exif_dict = {"0th": {}, "Exif": {}}
-                if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                exif_dict["0th"][piexif.ImageIFD.Orientation] = 1
-                exif_bytes = piexif.dump(exif_dict)
+                with STATS.stage("exif"):
+                    exif_dict = {"0th": {}, "Exif": {}}
+                    if EXIF in img.info:
+                        exif_dict = piexif.load(img.info[EXIF])
+                    exif_dict["0th"][piexif.ImageIFD.Orientation] = 1
+                    exif_bytes = piexif.dump(exif_dict)
 
                 file = Common.set_out_file(in_path, out_path, f"{angle_cw}cw")
-                # img.rotate() for any angle (slower & slight quality loss)
-                rotated_img = img
-                if angle_cw == 90:
-                    rotated_img = img.transpose(Image.ROTATE_270)
-                elif angle_cw == 180:
-                    rotated_img = img.transpose(Image.ROTATE_180)
-                elif angle_cw == 270:
-                    rotated_img = img.transpose(Image.ROTATE_90)
-
-                rotated_img.save(file, img.format, exif=exif_bytes, optimize=True)
+                if img.format == "JPEG":
+                    with STATS.stage("rotate lossless"):
+                        data = Rotate.rotate_jpeg_lossless(
+                            img, in_path, file, angle_cw, exif_bytes
+                        )
+                    if data:
+                        file = Common.save_bytes(data, in_path, out_path, file)
+                        log.debug(f"Rotated ({angle_cw}°) losslessly to {file}")
+                        return True, file
+                Common.load_image(img)
+                rotated_img = Rotate.rotate_img(img, angle_cw)
+                file = Common.save_image(
+                    rotated_img,
+                    in_path,
+                    out_path,
+                    file,
+                    img.format,
+                    exif=exif_bytes,
+                    optimize=True,
+                )
             log.debug(f"Saved ({angle_cw}°) clockwise rotated to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -82,15 +174,17 @@ class Rotate:
             log.error(f"Bad {angle_cw=}. Only allow 90, 180, 270")
             return False
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, angle_cw) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (f, Common.mirror_out_path(in_path, f, out_path), angle_cw)
+            for f in image_files
+        )
+        log.debug(f"Rotate image files in {in_path} ...")
+        # Decode, transpose and encode release the GIL; piexif is small
+        success_cnt, files_cnt = Common.executor_progress(
+            Rotate.rotate_1_image, "Rotate image files", tasks, gil_bound=False
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Rotate {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            Rotate.rotate_1_image, "Rotate image files", tasks
-        )
         log.info(f"\nSuccessfully rotated {success_cnt}/{files_cnt} files")
         return True
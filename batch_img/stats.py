@@ -0,0 +1,202 @@
+"""class Stats: count and time the stages run on the image files, e.g. the
+orientation tiers, across the worker threads and processes. Also keep the
+time of each task, e.g. for the latency percentiles of a benchmark
+Copyright © 2025 John Liu
+"""
+
+from contextlib import contextmanager, nullcontext
+from statistics import quantiles
+from threading import Lock, local
+from time import perf_counter
+
+from batch_img.opts import OPTS
+
+# Stage timer histogram: bucket i counts the runs under 2^i ms, the last one
+# counts the rest
+HIST_BUCKETS = 18
+NO_TIMER = nullcontext()
+
+
+class Stats:
+    def __init__(self):
+        # name: [tried count, hit count, seconds, histogram bucket counts...]
+        self.totals = {}
+        self.latencies = []  # seconds of each finished task
+        self._lock = Lock()
+        self._local = local()
+
+    def add(self, name: str, seconds: float, hit: bool = True) -> None:
+        """Record a stage run on an image file in this thread
+
+        Args:
+            name: stage name
+            seconds: stage time
+            hit: flag the stage got the result
+
+        Returns:
+            None
+        """
+        pending = self._local.__dict__.setdefault("pending", {})
+        tried, hits, total = pending.get(name, (0, 0, 0.0))
+        pending[name] = (tried + 1, hits + int(hit), total + seconds)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        """Record a timed stage run in this thread, with its histogram bucket
+
+        Args:
+            name: stage name
+            seconds: stage time
+
+        Returns:
+            None
+        """
+        pending = self._local.__dict__.setdefault("pending", {})
+        vals = list(pending.get(name, (0, 0, 0.0) + (0,) * HIST_BUCKETS))
+        vals[0] += 1
+        vals[1] += 1
+        vals[2] += seconds
+        vals[3 + min(int(seconds * 1000).bit_length(), HIST_BUCKETS - 1)] += 1
+        pending[name] = tuple(vals)
+
+    @contextmanager
+    def _time_stage(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(f"Stage {name}", perf_counter() - start)
+
+    def stage(self, name: str):
+        """Time a with block as a stage if OPTS.timings, else no-op
+
+        Args:
+            name: stage name, e.g. "decode"
+
+        Returns:
+            context manager
+        """
+        return self._time_stage(name) if OPTS.timings else NO_TIMER
+
+    def pop(self) -> dict:
+        """Take the records of this thread since the last pop, e.g. to return
+        them with the task result from a worker
+
+        Returns:
+            dict: name: (tried count, hit count, seconds[, histogram...])
+        """
+        return self._local.__dict__.pop("pending", {})
+
+    def merge(self, pending: dict) -> None:
+        """Add the records, e.g. from a worker, to the run totals
+
+        Args:
+            pending: dict of name: (tried count, hit count, seconds[, histogram...])
+
+        Returns:
+            None
+        """
+        with self._lock:
+            for name, vals in pending.items():
+                totals = self.totals.setdefault(name, [0, 0, 0.0] + [0] * len(vals[3:]))
+                for i, val in enumerate(vals):
+                    totals[i] += val
+
+    def add_latency(self, seconds: float) -> None:
+        """Record the time of a finished task, e.g. an image file
+
+        Args:
+            seconds: task time
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def reset(self) -> None:
+        """Clear the run totals, the task times and the records of this thread
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self.totals.clear()
+            self.latencies.clear()
+        self.pop()
+
+    def get_latency_summary(self) -> dict:
+        """Get the count and percentiles of the task times
+
+        Returns:
+            dict: count, p50_ms, p95_ms, max_ms
+        """
+        with self._lock:
+            vals = sorted(self.latencies) or [0.0]
+        cuts = (
+            quantiles(vals, n=100, method="inclusive") if len(vals) > 1 else vals * 99
+        )
+        return {
+            "count": len(self.latencies),
+            "p50_ms": round(cuts[49] * 1000, 1),
+            "p95_ms": round(cuts[94] * 1000, 1),
+            "max_ms": round(vals[-1] * 1000, 1),
+        }
+
+    @staticmethod
+    def get_percentile_ms(hist: list, fraction: float) -> float:
+        """Get the upper bound of the histogram bucket of a percentile
+
+        Args:
+            hist: histogram bucket counts
+            fraction: percentile fraction, e.g. 0.95
+
+        Returns:
+            float: ms, inf in the last bucket
+        """
+        count = 0
+        for i, n in enumerate(hist[:-1]):
+            count += n
+            if count >= fraction * sum(hist):
+                return float(2**i)
+        return float("inf")
+
+    def report(self) -> list:
+        """Get the report lines of the run totals
+
+        Returns:
+            list: str lines
+        """
+        lines = []
+        with self._lock:
+            for name, (tried, hits, seconds, *hist) in sorted(self.totals.items()):
+                line = f"avg {seconds / tried * 1000:.1f} ms, total {seconds:.2f}s"
+                if hist:
+                    p50 = self.get_percentile_ms(hist, 0.5)
+                    p95 = self.get_percentile_ms(hist, 0.95)
+                    line = f"{name}: {tried} runs, {line}, p50 < {p50:g} ms"
+                    line += f", p95 < {p95:g} ms"
+                else:
+                    line = f"{name}: hit {hits}/{tried} ({hits / tried:.0%}), {line}"
+                lines.append(line)
+        return lines
+
+    def to_dict(self) -> dict:
+        """Get the run totals as a dict, e.g. to save as JSON
+
+        Returns:
+            dict: name: dict of count, hits, seconds[, histogram_ms]. The
+                histogram keys are the bucket upper bounds in ms
+        """
+        res = {}
+        with self._lock:
+            for name, (tried, hits, seconds, *hist) in sorted(self.totals.items()):
+                res[name] = {"count": tried, "hits": hits, "seconds": round(seconds, 6)}
+                if hist:
+                    bounds = [str(2**i) for i in range(len(hist) - 1)] + ["inf"]
+                    res[name]["histogram_ms"] = {
+                        b: n for b, n in zip(bounds, hist, strict=True) if n
+                    }
+        return res
+
+
+STATS = Stats()
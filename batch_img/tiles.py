@@ -0,0 +1,105 @@
+"""class Tiles: process a big image in row strips within the memory ceiling of
+a worker (--max_memory), e.g. panoramas and scanned maps of hundreds of MP
+Copyright © 2025 John Liu
+"""
+
+from collections.abc import Callable
+
+from loguru import logger as log
+from PIL import Image
+
+from batch_img.const import DECODED_BYTES_PER_PX, MB
+from batch_img.opts import OPTS
+
+PIL_MAX_PIXELS = Image.MAX_IMAGE_PIXELS  # Pillow decompression bomb guard
+
+
+class Tiles:
+    @staticmethod
+    def set_max_pixels() -> None:
+        """Let Pillow open the images up to the memory ceiling, over its
+        decompression bomb guard. No ceiling - the Pillow default guard
+
+        Returns:
+            None
+        """
+        Image.MAX_IMAGE_PIXELS = (
+            OPTS.max_memory * MB // DECODED_BYTES_PER_PX
+            if OPTS.max_memory
+            else PIL_MAX_PIXELS
+        )
+
+    @staticmethod
+    def get_strip_rows(
+        img: Image.Image, bytes_per_px: int, halo: int = 0, copies: int = 1
+    ) -> int:
+        """Get the rows count of a strip to process within the memory ceiling,
+        next to the decoded image copies, e.g. the input and output
+
+        Args:
+            img: image
+            bytes_per_px: working memory per pixel of a strip
+            halo: overlap rows above and below a strip
+            copies: count of the whole decoded image copies
+
+        Returns:
+            int: rows count. The image height - no need of strips
+
+        Raises:
+            ValueError: the ceiling is too small for the image
+        """
+        width, height = img.size
+        ceiling = OPTS.max_memory * MB
+        copies_size = copies * width * height * DECODED_BYTES_PER_PX
+        if not ceiling or copies_size + width * height * bytes_per_px <= ceiling:
+            return height
+        rows = (ceiling - copies_size) // (width * bytes_per_px) - 2 * halo
+        if rows < 1:
+            raise ValueError(
+                f"max_memory={OPTS.max_memory} MB is too small for {width}x{height}"
+            )
+        log.debug(f"Process {width}x{height} in strips of {rows} rows")
+        return rows
+
+    @staticmethod
+    def map_strips(
+        img: Image.Image,
+        func: Callable,
+        bytes_per_px: int,
+        halo: int = 0,
+        mode: str = "",
+    ) -> Image.Image:
+        """Run the function on the row strips of the image with the overlap
+        halos, and paste the results without the halos together
+
+        Args:
+            img: image
+            func: function of an image to the same size image in the mode
+            bytes_per_px: working memory per pixel of the function
+            halo: overlap rows above and below a strip, e.g. the filter radius
+            mode: output mode. Default: the image mode, then paste in place
+
+        Returns:
+            Image.Image: the whole image result
+        """
+        width, height = img.size
+        mode = mode or img.mode
+        # Paste in place, or to the output image of another mode
+        rows = Tiles.get_strip_rows(img, bytes_per_px, halo, 1 + (mode != img.mode))
+        if rows >= height:
+            return func(img)
+        out = img if mode == img.mode else Image.new(mode, img.size)
+
+        def crop(top: int) -> tuple:
+            box = (0, max(top - halo, 0), width, min(top + rows + halo, height))
+            return box[1], img.crop(box)
+
+        upper, strip = crop(0)
+        for top in range(0, height, rows):
+            bottom = min(top + rows, height)
+            res = func(strip).crop((0, top - upper, width, bottom - upper))
+            if bottom < height:
+                # Crop the next strip before the paste overwrites its halo
+                upper, strip = crop(bottom)
+            out.paste(res, (0, top))
+        return out
@@ -2,48 +2,61 @@
 Copyright © 2025 John Liu
 """
 
-import os
 from pathlib import Path
 
 import piexif
 import pillow_heif
 from loguru import logger as log
-from PIL import Image
+from PIL import Image, ImageChops
 
 from batch_img.common import Common
-from batch_img.const import EXIF, REPLACE
+from batch_img.const import EXIF
+from batch_img.stats import STATS
+from batch_img.tiles import Tiles
 
 pillow_heif.register_heif_opener()
+# The strip crop, the bands, their LUT masks and the alpha
+WHITE_BYTES_PER_PX = 12
 
 
 class Transparent:
     @staticmethod
-    def set_white_pixel_transparent(img: Image.Image) -> None:
-        """Set white pixels in RGBA image transparent in-place
-        Non PNG white pixels Err: not enough values to unpack (expected 4, got 3)
+    def white_mask(img: Image.Image, tolerance: int = 0) -> Image.Image:
+        """Get the mask of the white pixels in the image, by LUT on each band
+
+        Args:
+            img: RGB or RGBA image
+            tolerance: 0 (pure white only) <= int <= 255. Max distance from 255
+            on every band of the near-white pixels
+
+        Returns:
+            Image.Image: L mode mask. 255 - white pixel, 0 - other
+        """
+        lut = [255 if v >= 255 - tolerance else 0 for v in range(256)]
+        r, g, b = (img.getchannel(band).point(lut) for band in "RGB")
+        return ImageChops.darker(ImageChops.darker(r, g), b)
+
+    @staticmethod
+    def set_white_pixel_transparent(img: Image.Image, tolerance: int = 0) -> None:
+        """Set white pixels in RGBA image transparent in-place, in row strips
+        over the memory ceiling
 
         Args:
             img: RGBA image
+            tolerance: 0 (pure white only) <= int <= 255. Max distance from 255
+            on every band of the near-white pixels
 
         Returns:
             None
         """
-        new_data = []
-        for t_pixel in img.getdata():
-            if len(t_pixel) == 4:
-                r, g, b, a = t_pixel
-                if (r, g, b) == (255, 255, 255):
-                    new_data.append((r, g, b, 0))
-                else:
-                    new_data.append((r, g, b, a))
-            else:
-                # Fallback in case of RGB pixel (shouldn't happen after convert)
-                r, g, b = t_pixel
-                if (r, g, b) == (255, 255, 255):
-                    new_data.append((r, g, b, 0))
-                else:
-                    new_data.append((r, g, b, 255))
-        img.putdata(new_data)
+
+        def set_white(region: Image.Image) -> Image.Image:
+            alpha = region.getchannel("A")
+            alpha.paste(0, mask=Transparent.white_mask(region, tolerance))
+            region.putalpha(alpha)
+            return region
+
+        Tiles.map_strips(img, set_white, WHITE_BYTES_PER_PX)
 
     @staticmethod
     def set_transparency(img: Image.Image, transparency: int) -> None:
@@ -56,14 +69,46 @@ class Transparent:
         Returns:
             None
         """
-        new_data = []
-        for t_pixel in img.getdata():
-            if len(t_pixel) == 4:
-                r, g, b, _ = t_pixel
-            else:
-                r, g, b = t_pixel
-            new_data.append((r, g, b, transparency))
-        img.putdata(new_data)
+        img.putalpha(transparency)
+
+    @staticmethod
+    def transparent_img(
+        img: Image.Image, transparency: int, white: bool, tolerance: int = 0
+    ) -> Image.Image:
+        """Set transparency on the image in memory
+
+        Args:
+            img: image
+            transparency: 0 (fully transparent) <= int <= 255 (completely opaque)
+            white: flag to make white pixels full transparent
+            tolerance: 0 (pure white only) <= int <= 255. Max distance from 255
+            on every band of the near-white pixels
+
+        Returns:
+            Image.Image: RGBA image
+        """
+        with STATS.stage("transparent"):
+            a_img = img.convert("RGBA")
+            Transparent.set_transparency(a_img, transparency)
+            if white:
+                Transparent.set_white_pixel_transparent(a_img, tolerance)
+        return a_img
+
+    @staticmethod
+    def get_extra(transparency: int, white: bool, tolerance: int) -> str:
+        """Get the output file name extra
+
+        Args:
+            transparency: 0 (fully transparent) <= int <= 255 (completely opaque)
+            white: flag to make white pixels full transparent
+            tolerance: near-white tolerance
+
+        Returns:
+            str
+        """
+        if not white:
+            return f"a{transparency}"
+        return f"a{transparency}w{tolerance}" if tolerance else f"a{transparency}w"
 
     @staticmethod
     def do_1_image_transparency(args: tuple) -> tuple:
@@ -77,37 +122,33 @@ class Transparent:
             out_path: output dir path or REPLACE
             transparency: 0 (fully transparent) <= int <= 255 (completely opaque)
             white: flag to make white pixels full transparent
+            tolerance: near-white tolerance
 
         Returns:
             tuple: bool, str
         """
-        in_path, out_path, transparency, white = args
+        in_path, out_path, transparency, white, tolerance = args
         Common.set_log_by_process()
         try:
             with Image.open(in_path) as img:
-                a_img = img.convert("RGBA")
-                Transparent.set_transparency(a_img, transparency)
-                extra = f"a{transparency}"
-                if white:
-                    Transparent.set_white_pixel_transparent(a_img)
-                    extra = f"a{transparency}w"
+                Common.load_image(img)
+                a_img = Transparent.transparent_img(img, transparency, white, tolerance)
+                extra = Transparent.get_extra(transparency, white, tolerance)
                 file = Common.set_out_file(in_path, out_path, extra)
                 i_format = img.format
                 if i_format == "JPEG":
                     i_format = "PNG"
                     file = Path(f"{file.parent}/{file.stem}.png")
                     log.debug(f"Revised {file=}")
+                params = {"optimize": True}
                 if EXIF in img.info:
-                    exif_dict = piexif.load(img.info[EXIF])
-                    exif_bytes = piexif.dump(exif_dict)
-                    a_img.save(file, format=i_format, optimize=True, exif=exif_bytes)
-                else:
-                    a_img.save(file, format=i_format, optimize=True)
+                    with STATS.stage("exif"):
+                        exif_dict = piexif.load(img.info[EXIF])
+                        params[EXIF] = piexif.dump(exif_dict)
+                file = Common.save_image(
+                    a_img, in_path, out_path, file, i_format, **params
+                )
             log.debug(f"Saved transparent image to {file}")
-            if out_path == REPLACE:
-                os.replace(file, in_path)
-                log.debug(f"Replaced {in_path} with the new tmp_file")
-                file = in_path
             return True, file
         except (AttributeError, FileNotFoundError, ValueError) as e:
             log.error(e)
@@ -115,7 +156,11 @@ class Transparent:
 
     @staticmethod
     def all_images_transparency(
-        in_path: Path, out_path: Path | str, transparency: int, white: bool
+        in_path: Path,
+        out_path: Path | str,
+        transparency: int,
+        white: bool,
+        tolerance: int = 0,
     ) -> bool:
         """Set transparency on all image files in a folder.
         If the input file is JPEG, it will be saved as PNG file because JPEG does
@@ -126,20 +171,33 @@ class Transparent:
             out_path: output dir path or REPLACE
             transparency: 0 (fully transparent) <= int <= 255 (completely opaque)
             white: flag to make white pixels full transparent
+            tolerance: near-white tolerance
 
         Returns:
             bool: True - Success. False - Error
         """
         image_files = Common.prepare_all_files(in_path, out_path)
-        tasks = [(f, out_path, transparency, white) for f in image_files]
-        files_cnt = len(tasks)
+        tasks = (
+            (
+                f,
+                Common.mirror_out_path(in_path, f, out_path),
+                transparency,
+                white,
+                tolerance,
+            )
+            for f in image_files
+        )
+        log.debug(f"Set transparency on image files in {in_path} ...")
+        # The alpha is set by whole-image Pillow C ops (putalpha, LUT, paste),
+        # no per pixel Python. Decode and encode dominate and release the GIL
+        success_cnt, files_cnt = Common.executor_progress(
+            Transparent.do_1_image_transparency,
+            "Set transparency",
+            tasks,
+            gil_bound=False,
+        )
         if files_cnt == 0:
             log.error(f"No image files at {in_path}")
             return False
-
-        log.debug(f"Set transparency on {files_cnt} image files in multiprocess ...")
-        success_cnt = Common.executor_progress(
-            Transparent.do_1_image_transparency, "Set transparency", tasks
-        )
         log.info(f"\nDone - set transparency on {success_cnt}/{files_cnt} files")
         return True
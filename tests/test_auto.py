@@ -136,3 +136,12 @@ def test_auto_on_all(data_run_on_all):
     in_path, out_path, auto_rotate, expected = data_run_on_all
     actual = Auto.auto_on_all(in_path, out_path, auto_rotate)
     assert actual == expected
+
+
+def test_auto_do_1_image_write_once(tmp_path):
+    in_path = Path(f"{_dir}/data/HEIC/IMG_0131.HEIC")
+    ok, file = Auto.auto_do_1_image((in_path, tmp_path, True))
+    assert ok is True
+    # Rotated in memory: no intermediate file
+    assert sorted(tmp_path.iterdir()) == [tmp_path / "IMG_0131_bw5_270cw.HEIC"]
+    assert file == tmp_path / "IMG_0131_bw5_270cw.HEIC"
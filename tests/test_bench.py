@@ -0,0 +1,126 @@
+"""Test bench.py
+pytest -sv tests/test_bench.py
+Copyright © 2025 John Liu
+"""
+
+import json
+from dataclasses import asdict
+
+import piexif
+import pytest
+from PIL import Image
+
+from batch_img.bench import Bench, BenchResult
+
+
+def make_result(**vals) -> BenchResult:
+    res = {
+        "op": "resize",
+        "executor": "thread",
+        "workers": 0,
+        "files": 6,
+        "ok": True,
+        "seconds": 2.0,
+        "images_s": 3.0,
+        "mp_s": 30.0,
+        "p50_ms": 300.0,
+        "p95_ms": 500.0,
+        "peak_rss_mb": 400.0,
+    }
+    return BenchResult(**{**res, **vals})
+
+
+@pytest.fixture(
+    params=[
+        ("64x48", (True, [(64, 48)])),
+        ("2048x1536,4032X3024", (True, [(2048, 1536), (4032, 3024)])),
+        ("64", (False, "Bad size '64'. Use WIDTHxHEIGHT,...")),
+        ("64x0", (False, "Bad size '64x0'. Use WIDTHxHEIGHT,...")),
+        ("64x48,axb", (False, "Bad size 'axb'. Use WIDTHxHEIGHT,...")),
+    ]
+)
+def data_parse_sizes(request):
+    return request.param
+
+
+def test_parse_sizes(data_parse_sizes):
+    text, expected = data_parse_sizes
+    assert Bench.parse_sizes(text) == expected
+
+
+def test_make_corpus(tmp_path):
+    files = Bench.make_corpus(tmp_path, [(64, 48), (40, 30)], 2)
+    assert len(files) == 12
+    formats = set()
+    for file in files:
+        with Image.open(file) as img:
+            assert img.size in {(64, 48), (40, 30)}
+            formats.add(img.format)
+            assert piexif.load(img.info["exif"])["GPS"]
+    assert formats == {"JPEG", "PNG", "HEIF"}
+    # Keep the files already made
+    mtimes = [f.stat().st_mtime_ns for f in files]
+    assert Bench.make_corpus(tmp_path, [(64, 48), (40, 30)], 2) == files
+    assert [f.stat().st_mtime_ns for f in files] == mtimes
+    assert Bench.get_megapixels(files) == pytest.approx(6 * (64 * 48 + 40 * 30) / 1e6)
+
+
+def test_make_image():
+    img = Bench.make_image(64, 48, seed=1)
+    assert img.mode == "RGB"
+    assert img.size == (64, 48)
+    assert img.tobytes() == Bench.make_image(64, 48, seed=1).tobytes()
+    assert img.tobytes() != Bench.make_image(64, 48, seed=2).tobytes()
+
+
+def test_run_all(tmp_path):
+    Bench.make_corpus(tmp_path, [(64, 48)], 1)
+    actual = Bench.run_all(tmp_path, ["border"], ["thread"], [1])
+    assert len(actual) == 1
+    res = actual[0]
+    assert res.key == "border thread x1"
+    assert res.ok
+    assert res.files == 3
+    assert res.images_s > 0
+    assert 0 < res.p50_ms <= res.p95_ms
+    assert res.peak_rss_mb > 0
+    # The corpus is not changed
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_format_table():
+    actual = Bench.format_table([make_result(), make_result(workers=2, ok=False)])
+    assert actual == [
+        "case                             files  images/s     MP/s    p50 ms"
+        "    p95 ms   RSS MB",
+        "resize thread xauto                  6      3.00    30.00     300.0"
+        "     500.0    400.0",
+        "resize thread x2                     6      3.00    30.00     300.0"
+        "     500.0    400.0  FAILED",
+    ]
+
+
+@pytest.fixture(
+    params=[
+        ([make_result()], []),
+        ([make_result(images_s=2.8, p95_ms=540.0, peak_rss_mb=430.0)], []),
+        (
+            [make_result(images_s=2.0, p95_ms=600.0, peak_rss_mb=300.0)],
+            [
+                "resize thread xauto: images/s 2.0 vs 3.0 (-33%)",
+                "resize thread xauto: p95 ms 600.0 vs 500.0 (+20%)",
+            ],
+        ),
+        ([make_result(op="border", images_s=1.0)], []),
+    ]
+)
+def data_compare(request):
+    return request.param
+
+
+def test_compare(tmp_path, data_compare):
+    results, expected = data_compare
+    baseline = tmp_path / "base.json"
+    Bench.save_json([make_result()], baseline)
+    assert json.loads(baseline.read_text())["results"] == [asdict(make_result())]
+    assert Bench.compare(results, baseline, 10) == expected
@@ -4,16 +4,22 @@ Copyright © 2025 - Present John Liu
 """
 
 import json
+import os
 import subprocess
 from os.path import dirname
 from pathlib import Path
+from threading import Lock, Semaphore
 from unittest.mock import MagicMock, patch
 
 import httpx
+import piexif
 import pytest
+from PIL import Image
 
 from batch_img.common import Common
 from batch_img.const import PKG_NAME, REPLACE, UNKNOWN
+from batch_img.opts import OPTS
+from batch_img.stats import STATS
 
 from .helper import DotDict
 
@@ -281,6 +287,27 @@ def test_remove_exif_gps(data_remove_exif_gps):
     assert actual[0] == expected
 
 
+def test_blank_exif_gps(data_remove_exif_gps):
+    exif_data, expected = data_remove_exif_gps
+    blanked, actual = Common.blank_exif_gps(exif_data)
+    assert blanked == expected
+    assert len(actual) == len(exif_data)
+    exif_dict = piexif.load(actual)
+    assert not exif_dict.get("GPS")
+    # not changed out of the GPS IFD
+    assert exif_dict["0th"] == piexif.load(exif_data)["0th"]
+
+
+@pytest.fixture(params=[b"", b"Exif\x00\x00XX", b"II*\x00\xff\xff"])
+def data_error_blank_exif_gps(request):
+    return request.param
+
+
+def test_error_blank_exif_gps(data_error_blank_exif_gps):
+    exif_data = data_error_blank_exif_gps
+    assert Common.blank_exif_gps(exif_data) == (False, exif_data)
+
+
 @pytest.fixture(
     params=[
         (
@@ -546,6 +573,51 @@ def test_prepare_all_files(data_prepare_all_files):
     assert len(list(actual)) == expected
 
 
+@pytest.fixture(
+    params=[
+        (False, 1, ["a.JPG", "b.png"]),
+        (True, 1, ["a.JPG", "b.png", "c.Heic", "d.jpeg"]),
+        (True, 4, ["a.JPG", "b.png", "c.Heic", "d.jpeg"]),
+    ]
+)
+def data_walk_image_files(request):
+    return request.param
+
+
+def test_walk_image_files(monkeypatch, tmp_path, data_walk_image_files):
+    recursive, scan_threads, expected = data_walk_image_files
+    monkeypatch.setattr(OPTS, "recursive", recursive)
+    monkeypatch.setattr(OPTS, "scan_threads", scan_threads)
+    for name in ("a.JPG", "b.png", "x.txt", "sub/c.Heic", "sub/deep/d.jpeg"):
+        (tmp_path / name).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / name).write_bytes(b"")
+    (tmp_path / ".out").mkdir()
+    (tmp_path / ".out/e.jpg").write_bytes(b"")
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out/f.jpg").write_bytes(b"")
+    (tmp_path / "b_link.png").symlink_to(tmp_path / "b.png")
+    files = Common.walk_image_files(tmp_path, (tmp_path / "out").resolve())
+    actual = sorted(f.name for f in files)
+    assert actual == expected
+
+
+@pytest.fixture(
+    params=[
+        (Path("in"), Path("in/a.jpg"), Path("out"), Path("out")),
+        (Path("in"), Path("in/x/y/a.jpg"), Path("out"), Path("out/x/y")),
+        (Path("in"), Path("in/x/a.jpg"), REPLACE, REPLACE),
+        (Path("in"), Path("in/x/a.jpg"), "", ""),
+    ]
+)
+def data_mirror_out_path(request):
+    return request.param
+
+
+def test_mirror_out_path(data_mirror_out_path):
+    in_path, file, out_path, expected = data_mirror_out_path
+    assert Common.mirror_out_path(in_path, file, out_path) == expected
+
+
 @pytest.fixture(
     params=[
         (
@@ -582,3 +654,158 @@ def test_set_out_file(data_set_out_file):
     in_path, out_path, extra, expected = data_set_out_file
     actual = Common.set_out_file(in_path, out_path, extra)
     assert actual == expected
+
+
+@pytest.fixture(
+    params=[
+        ("auto", True, "process"),
+        ("auto", False, "thread"),
+        ("thread", True, "thread"),
+        ("process", False, "process"),
+        ("bogus", True, "process"),
+    ]
+)
+def data_pick_executor(request):
+    return request.param
+
+
+def test_pick_executor(monkeypatch, data_pick_executor):
+    executor, gil_bound, expected = data_pick_executor
+    monkeypatch.setattr(OPTS, "executor", executor)
+    actual = Common.pick_executor(gil_bound)
+    assert actual == expected
+
+
+def square_it(task: tuple) -> tuple:
+    """Picklable task function for the process executor"""
+    (num,) = task
+    return num >= 0, num * num
+
+
+def got_parent_opts(task: tuple) -> tuple:
+    """Picklable task function: check the worker got the options of the parent"""
+    return OPTS.executor == "process", task
+
+
+@pytest.fixture(
+    params=[
+        ("thread", square_it, [(1,), (2,), (-3,)], (2, 3)),
+        ("process", square_it, [(1,), (2,), (-3,), (4,)], (3, 4)),
+        ("process", got_parent_opts, [(1,), (2,)], (2, 2)),
+        ("thread", square_it, ((i,) for i in range(-2, 20)), (20, 22)),
+        ("process", square_it, ((i,) for i in range(-2, 20)), (20, 22)),
+        ("thread", square_it, iter([]), (0, 0)),
+    ]
+)
+def data_executor_progress(request):
+    return request.param
+
+
+def test_executor_progress(monkeypatch, data_executor_progress):
+    executor, func, tasks, expected = data_executor_progress
+    monkeypatch.setattr(OPTS, "executor", executor)
+    actual = Common.executor_progress(func, "Test", tasks)
+    assert actual == expected
+
+
+def test_executor_progress_window(monkeypatch):
+    monkeypatch.setattr(OPTS, "executor", "thread")
+    monkeypatch.setattr(OPTS, "window", 3)
+    pulled, in_flight = [], []
+    lock = Lock()
+
+    def gen_tasks():
+        for i in range(30):
+            pulled.append(i)
+            yield (i,)
+
+    def run_task(task: tuple) -> tuple:
+        with lock:
+            in_flight.append(len(pulled) - task[0])
+        return True, task
+
+    actual = Common.executor_progress(run_task, "Test", gen_tasks())
+    assert actual == (30, 30)
+    # Never pulled more than the window ahead of the running task
+    assert max(in_flight) <= 3 + 1
+
+
+@pytest.fixture(
+    params=[(0, [(1,)] * 9, 4), (0, [(1,)] * 2, 2), (2, iter([]), 2), (16, [], 1)]
+)
+def data_get_workers(request):
+    return request.param
+
+
+def test_get_workers(monkeypatch, data_get_workers):
+    workers, tasks, expected = data_get_workers
+    monkeypatch.setattr(OPTS, "workers", workers)
+    monkeypatch.setattr("batch_img.common.cpu_count", lambda: 1)
+    assert Common.get_workers(tasks) == expected
+
+
+@pytest.fixture(params=[(0, 5, 20), (7, 5, 7)])
+def data_get_window(request):
+    return request.param
+
+
+def test_get_window(monkeypatch, data_get_window):
+    window, workers, expected = data_get_window
+    monkeypatch.setattr(OPTS, "window", window)
+    assert Common.get_window(workers) == expected
+
+
+def test_throttle():
+    slots = Semaphore(2)
+    gen = Common.throttle(iter(range(5)), slots)
+    assert [next(gen), next(gen)] == [0, 1]
+    assert slots.acquire(blocking=False) is False
+    slots.release()
+    assert next(gen) == 2
+
+
+@pytest.fixture(params=[("", 0), ("-", 1)])
+def data_load_image(request):
+    return request.param
+
+
+def test_load_image(monkeypatch, data_load_image):
+    timings, expected = data_load_image
+    monkeypatch.setattr(OPTS, "timings", timings)
+    STATS.pop()
+    with Image.open(f"{_dir}/data/JPG/roof.jpg") as img:
+        Common.load_image(img)
+        assert not img.tile
+    assert STATS.pop().get("Stage decode", [0])[0] == expected
+
+
+@pytest.fixture(params=[(False, False), (True, True)])
+def data_save_image(request):
+    return request.param
+
+
+def test_save_image(monkeypatch, tmp_path, data_save_image):
+    incremental, expected = data_save_image
+    monkeypatch.setattr(OPTS, "incremental", incremental)
+    in_path = tmp_path / "a.png"
+    img = Image.new("RGB", (8, 8), "red")
+    img.save(in_path, "PNG")
+    os.utime(in_path, ns=(0, 0))
+    file = Common.set_out_file(in_path, REPLACE)
+    actual = Common.save_image(img, in_path, REPLACE, file, "PNG")
+    assert actual == in_path
+    assert not file.exists()
+    # the same bytes are not rewritten in the incremental mode
+    assert (in_path.stat().st_mtime_ns == 0) == expected
+
+
+def test_save_image_out_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(OPTS, "incremental", True)
+    in_path = tmp_path / "a.png"
+    file = tmp_path / "out" / "a_x.png"
+    file.parent.mkdir()
+    actual = Common.save_image(
+        Image.new("L", (4, 4)), in_path, file.parent, file, "PNG"
+    )
+    assert actual == file
+    assert Image.open(file).size == (4, 4)
@@ -0,0 +1,150 @@
+"""Test effect.py
+pytest -sv tests/test_effect.py
+Copyright © 2025 John Liu
+"""
+
+from os.path import dirname
+from pathlib import Path
+from time import perf_counter
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+from batch_img import effect
+from batch_img.effect import EFFECTS, Effect
+
+_dir = dirname(__file__)
+
+
+def full_float_neon(img, glow_intensity, edge_thickness):
+    """The reference: neon glow on the full-size float32 copies"""
+    edges = cv2.Canny(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), 100, 200)
+    kernel = np.ones((edge_thickness, edge_thickness), np.uint8)
+    glow = cv2.GaussianBlur(cv2.dilate(edges, kernel), (15, 15), 0)
+    glow_normalized = glow.astype(np.float32) / 255.0
+    glow_colored = np.zeros_like(img, dtype=np.float32)
+    glow_colored[:, :, 0] = glow_normalized * 255
+    glow_colored[:, :, 2] = glow_normalized * 255
+    result = cv2.addWeighted(
+        img.astype(np.float32), 0.7, glow_colored, glow_intensity, 0
+    )
+    return np.clip(result, 0, 255).astype(np.uint8)
+
+
+def full_float_tone_map(img, gamma, saturation):
+    """The reference: HDR tone mapping on the full-size float32 copies"""
+    hdr = img.astype(np.float32) / 255.0
+    luminance = 0.2126 * hdr[:, :, 2] + 0.7152 * hdr[:, :, 1] + 0.0722 * hdr[:, :, 0]
+    luminance += 1e-6
+    tonemapped = np.power(hdr / luminance[:, :, np.newaxis], gamma)
+    with np.errstate(invalid="ignore"):
+        hsv = cv2.cvtColor((tonemapped * 255).astype(np.uint8), cv2.COLOR_BGR2HSV)
+    hsv[:, :, 1] = np.clip(hsv[:, :, 1] * saturation, 0, 255)
+    return cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+
+def full_float_hdr(img, gamma, saturation):
+    """The reference: HDR on the full-size float32 copies"""
+    lab = cv2.cvtColor(full_float_tone_map(img, gamma, saturation), cv2.COLOR_BGR2LAB)
+    l_channel, a_channel, b_channel = cv2.split(lab)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    lab = cv2.merge([clahe.apply(l_channel), a_channel, b_channel])
+    return cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+
+
+def test_get_scratch():
+    buf = Effect.get_scratch("test", (2, 3))
+    assert buf.dtype == np.float32
+    assert Effect.get_scratch("test", (2, 3)) is buf
+    assert Effect.get_scratch("test", (4, 3)) is not buf
+    assert Effect.get_scratch("test", (4, 3), np.uint8).dtype == np.uint8
+
+
+@pytest.fixture(
+    params=[
+        (Path(f"{_dir}/data/JPG/152.JPG"), "neon", full_float_neon),
+        (Path(f"{_dir}/data/JPG/152.JPG"), "hdr", full_float_hdr),
+        (Path(f"{_dir}/data/PNG/Checkmark.PNG"), "neon", full_float_neon),
+        (Path(f"{_dir}/data/PNG/Checkmark.PNG"), "hdr", full_float_hdr),
+    ]
+)
+def data_effect_strips(request):
+    return request.param
+
+
+def test_effect_strips(monkeypatch, data_effect_strips):
+    file, name, reference = data_effect_strips
+    # Many strips and a short last one
+    monkeypatch.setattr(effect, "STRIP_PIXELS", 50_000)
+    with Image.open(file) as img:
+        opencv_img = np.array(img)
+    func = Effect.neon_glow_effect if name == "neon" else Effect.hdr_effect
+    with np.errstate(invalid="ignore"):
+        actual = func(opencv_img, **EFFECTS[name])
+    expected = reference(opencv_img, **EFFECTS[name])
+    if name == "neon":
+        assert np.array_equal(actual, expected)
+    else:
+        # The LUT float math rounds differently on a few pixels
+        assert (actual != expected).any(axis=2).mean() < 1e-4
+
+
+@pytest.fixture(params=[(1.2, 1.0), (1.2, 1.5), (0.8, 0.5)])
+def data_get_hdr_luts(request):
+    return request.param
+
+
+def test_get_hdr_luts(data_get_hdr_luts):
+    gamma, saturation = data_get_hdr_luts
+    gamma_lut, hsv_lut = Effect.get_hdr_luts(gamma, saturation)
+    assert Effect.get_hdr_luts(gamma, saturation)[0] is gamma_lut
+    assert effect.HDR_LUTS[(gamma, saturation)][1] is hsv_lut
+    values = np.arange(256)
+    assert np.allclose(gamma_lut, np.power(values / 255, gamma) * 255, atol=1e-3)
+    assert hsv_lut.shape == (1, 256, 3)
+    assert np.array_equal(hsv_lut[0, :, 0], values)
+    assert np.array_equal(hsv_lut[0, :, 2], values)
+    expected = np.clip(values * saturation, 0, 255).astype(np.uint8)
+    assert np.array_equal(hsv_lut[0, :, 1], expected)
+
+
+def test_tone_map_vs_float():
+    with Image.open(f"{_dir}/data/JPG/roof.jpg") as img:
+        opencv_img = np.array(img)
+    args = EFFECTS["hdr"]
+    times = {}
+    outputs = {}
+    for name, func in (("lut", Effect.tone_map), ("float", full_float_tone_map)):
+        elapsed = []
+        for _ in range(3):
+            start = perf_counter()
+            with np.errstate(invalid="ignore"):
+                outputs[name] = func(opencv_img, **args)
+            elapsed.append(perf_counter() - start)
+        times[name] = min(elapsed)
+    diff = np.abs(outputs["lut"].astype(int) - outputs["float"])
+    print(f"\n{times=}, differ: {(diff > 0).mean():.4%}, max diff: {diff.max()}")
+    assert (diff > 1).mean() < 1e-4
+    assert times["lut"] < times["float"]
+
+
+@pytest.fixture(
+    params=[
+        (Path(f"{_dir}/data/JPG/152.JPG"), (595, 800, 3)),
+        (Path(f"{_dir}/data/PNG/Checkmark.PNG"), (2796, 1290, 3)),
+    ]
+)
+def data_apply_blur(request):
+    return request.param
+
+
+def test_apply_blur(data_apply_blur):
+    file, shape = data_apply_blur
+    with Image.open(file) as img:
+        actual, out_file = Effect().apply_effects(img, file, "blur")
+        expected = cv2.GaussianBlur(np.array(img.convert("RGB")), **EFFECTS["blur"])
+    assert out_file == file.with_stem(f"{file.stem}_blur")
+    assert actual.shape == shape
+    assert np.array_equal(actual, expected)
@@ -11,8 +11,10 @@ from click.testing import CliRunner
 from batch_img.const import MSG_BAD, MSG_OK
 from batch_img.interface import (
     auto,
+    bench,
     border,
     do_effect,
+    pipeline,
     remove_bg,
     remove_gps,
     resize,
@@ -26,6 +28,7 @@ from batch_img.interface import (
         ("src_path -o out/dir", True, MSG_OK),
         ("img/file --output out/file -ar", False, MSG_BAD),
         ("src_path --auto_rotate", True, MSG_OK),
+        ("src_path --executor process", True, MSG_OK),
     ]
 )
 def data_auto(request):
@@ -44,6 +47,44 @@ def test_auto(mock_auto, data_auto):
     assert result.output == expected
 
 
+@pytest.fixture(
+    params=[
+        ("", True, MSG_OK),
+        ("--sizes 64x48 --count 2 --op resize --op auto_rotate", True, MSG_OK),
+        ("--executor thread --workers 1 --workers 4 --json b.json", True, MSG_OK),
+        ("--baseline b.json --tolerance 5 --max_memory 512", False, MSG_BAD),
+    ]
+)
+def data_bench(request):
+    return request.param
+
+
+@patch("batch_img.main.Main.bench")
+def test_bench(mock_bench, data_bench):
+    _input, res, expected = data_bench
+    mock_bench.return_value = res
+    expected += "\n"
+    runner = CliRunner()
+    result = runner.invoke(bench, args=_input.split())
+    print(result.output)
+    assert not result.exception
+    assert result.output == expected
+
+
+@pytest.fixture(params=["--op bogus", "--executor auto", "--count 0", "--workers -1"])
+def data_error_bench(request):
+    return request.param
+
+
+@patch("batch_img.main.Main.bench")
+def test_error_bench(mock_bench, data_error_bench):
+    mock_bench.return_value = True
+    runner = CliRunner()
+    result = runner.invoke(bench, args=data_error_bench.split())
+    print(result.output)
+    assert result.exception
+
+
 @pytest.fixture(
     params=[
         ("src_path -bw 3 --border_color #AABBCC", True, MSG_OK),
@@ -105,11 +146,40 @@ def test_do_effect(mock_border, data_effect):
     assert result.output == expected
 
 
+@pytest.fixture(
+    params=[
+        ("src_path -s resize:800 -s border:5 -o out/dir", True, MSG_OK),
+        ("img/file --step rotate:90 --step remove-gps", False, MSG_BAD),
+    ]
+)
+def data_pipeline(request):
+    return request.param
+
+
+@patch("batch_img.main.Main.pipeline")
+def test_pipeline(mock_pipeline, data_pipeline):
+    _input, res, expected = data_pipeline
+    mock_pipeline.return_value = res
+    expected += "\n"
+    runner = CliRunner()
+    result = runner.invoke(pipeline, args=_input.split())
+    print(result.output)
+    assert not result.exception
+    assert result.output == expected
+
+
+def test_error_pipeline():
+    runner = CliRunner()
+    result = runner.invoke(pipeline, args=["src_path"])
+    assert result.exit_code == 2
+
+
 @pytest.fixture(
     params=[
         ("src_path -o out/dir", True, MSG_OK),
         ("img/file --output out/file", False, MSG_BAD),
         ("src_path", True, MSG_OK),
+        ("src_path --model u2netp --model_dir ~/models", True, MSG_OK),
     ]
 )
 def data_remove_bg(request):
@@ -128,6 +198,14 @@ def test_remove_bg(mock_remove_bg, data_remove_bg):
     assert result.output == expected
 
 
+@patch("batch_img.main.Main.remove_bg")
+def test_error_remove_bg(mock_remove_bg):
+    mock_remove_bg.return_value = True
+    runner = CliRunner()
+    result = runner.invoke(remove_bg, args=["src_path", "--model", "bogus"])
+    assert result.exit_code == 2
+
+
 @pytest.fixture(
     params=[
         ("src_path -o out/dir", True, MSG_OK),
@@ -156,6 +234,10 @@ def test_remove_gps(mock_remove_gps, data_no_gps):
         ("src_path -l 1234 -o out/dir", True, MSG_OK),
         ("img/file --length 9876 --output out/file", False, MSG_BAD),
         ("src_path -l 1234", True, MSG_OK),
+        ("src_path -l 1234 --executor thread", True, MSG_OK),
+        ("src_path -l 1234 --max_memory 2048", True, MSG_OK),
+        ("src_path -l 1234 --workers 2", True, MSG_OK),
+        ("src_path -l 1234 --timings t.json", True, MSG_OK),
     ]
 )
 def data_resize(request):
@@ -174,9 +256,20 @@ def test_resize(mock_resize, data_resize):
     assert result.output == expected
 
 
+@pytest.fixture(
+    params=[
+        "img/file --length -9",
+        "img/file -l 9 --executor bogus",
+        "img/file -l 9 --max_memory -1",
+    ]
+)
+def data_error_resize(request):
+    return request.param
+
+
 @patch("batch_img.main.Main.resize")
-def test_error_resize(mock_resize):
-    _input = "img/file --length -9"
+def test_error_resize(mock_resize, data_error_resize):
+    _input = data_error_resize
     mock_resize.return_value = True
     runner = CliRunner()
     result = runner.invoke(resize, args=_input.split())
@@ -189,6 +282,7 @@ def test_error_resize(mock_resize):
         ("src_path -a 90 -o out/dir", True, MSG_OK),
         ("img/file --angle 270 --output out/file", False, MSG_BAD),
         ("src_path -a 90", True, MSG_OK),
+        ("src_path -a 180 --jpeg_lossless trim", True, MSG_OK),
     ]
 )
 def data_rotate(request):
@@ -222,6 +316,7 @@ def test_error_rotate(mock_rotate):
         ("src_path -t 123 -o out/dir -w", True, MSG_OK),
         ("img/file --transparency 255 --output out/file", False, MSG_BAD),
         ("src_path -t 0 --white", True, MSG_OK),
+        ("src_path -w --white_tolerance 16", True, MSG_OK),
     ]
 )
 def data_transparent(request):
@@ -240,9 +335,16 @@ def test_transparent(mock_rotate, data_transparent):
     assert result.output == expected
 
 
+@pytest.fixture(
+    params=["img/file --transparency -1", "img/file -w --white_tolerance 256"]
+)
+def data_error_transparent(request):
+    return request.param
+
+
 @patch("batch_img.main.Main.transparent")
-def test_error_transparent(mock_transparent):
-    _input = "img/file --transparency -1"
+def test_error_transparent(mock_transparent, data_error_transparent):
+    _input = data_error_transparent
     mock_transparent.return_value = True
     runner = CliRunner()
     result = runner.invoke(transparent, args=_input.split())
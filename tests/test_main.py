@@ -3,12 +3,16 @@ pytest -sv tests/test_main.py
 Copyright © 2025 John Liu
 """
 
+import json
 from os.path import dirname
 from unittest.mock import patch
 
 import pytest
 
+from batch_img.bench import BENCH_OPS, BenchResult
 from batch_img.main import Main
+from batch_img.opts import OPTS
+from batch_img.stats import STATS
 
 _dir = dirname(__file__)
 
@@ -161,6 +165,55 @@ def test_do_effect(
     assert actual == expected
 
 
+@pytest.fixture(
+    params=[
+        (
+            "v_1",
+            "v_2",
+            {
+                "src_path": "src/file",
+                "steps": ("resize:800", "border:5,black"),
+                "output": f"{_dir}/.out/",
+            },
+            "v_2",
+        ),
+        (
+            "v_1",
+            "v_2",
+            {
+                "src_path": "src/file",
+                "steps": ("rotate:45",),
+            },
+            False,
+        ),
+        (
+            "v_1",
+            "v_2",
+            {
+                "src_path": "src/file",
+            },
+            False,
+        ),
+    ]
+)
+def data_pipeline(request):
+    return request.param
+
+
+@patch("batch_img.common.Common.check_latest_version")
+@patch("batch_img.pipeline.Pipeline.run_all_in_dir")
+@patch("batch_img.pipeline.Pipeline.run_1_image")
+def test_pipeline(
+    mock_run_1_image, mock_run_all_in_dir, mock_check_latest_version, data_pipeline
+):
+    v_1, v_2, options, expected = data_pipeline
+    mock_run_1_image.return_value = v_1
+    mock_run_all_in_dir.return_value = v_2
+    mock_check_latest_version.return_value = "ok"
+    actual = Main.pipeline(options)
+    assert actual == expected
+
+
 @pytest.fixture(
     params=[
         (
@@ -364,6 +417,12 @@ def test_rotate_all_in_dir(data_rotate_all):
             {"src_path": "src/file", "transparency": 20, "output": "out/path"},
             "v_2",
         ),
+        (
+            "v_1",
+            "v_2",
+            {"src_path": "src/file", "transparency": 9, "white_tolerance": 8},
+            "v_2",
+        ),
     ]
 )
 def data_transparent(request):
@@ -408,3 +467,66 @@ def test_all_images_transparent(data_all_transparent):
     options, expected = data_all_transparent
     actual = Main.transparent(options)
     assert actual == expected
+
+
+@pytest.fixture(
+    params=[
+        ({"sizes": "64x0"}, [], None, False),
+        ({"sizes": "64x48", "ops": ("border",)}, [True], None, True),
+        ({"sizes": "64x48", "json_file": "b.json"}, [True, False], None, False),
+        ({"sizes": "64x48", "baseline": "b.json"}, [True], [], True),
+        ({"sizes": "64x48", "baseline": "b.json"}, [True], ["border -9%"], False),
+    ]
+)
+def data_bench(request):
+    return request.param
+
+
+@patch("batch_img.common.Common.check_latest_version")
+@patch("batch_img.bench.Bench.compare")
+@patch("batch_img.bench.Bench.run_all")
+def test_bench(
+    mock_run_all, mock_compare, mock_check_latest_version, tmp_path, data_bench
+):
+    options, oks, regressions, expected = data_bench
+    results = [
+        BenchResult("border", "thread", 0, 3, ok, 1, 3, 1, 1, 1, 1) for ok in oks
+    ]
+    mock_run_all.return_value = results
+    mock_compare.return_value = regressions
+    mock_check_latest_version.return_value = "ok"
+    json_file = tmp_path / "b.json"
+    if options.get("json_file"):
+        options = {**options, "json_file": str(json_file)}
+    actual = Main.bench({**options, "corpus": str(tmp_path / "corpus")})
+    assert actual == expected
+    if options.get("sizes") == "64x48":
+        # Generated the corpus, then ran the ops on it
+        assert len(list((tmp_path / "corpus").iterdir())) == 3
+        ops = mock_run_all.call_args.args[1]
+        assert list(ops) == list(options.get("ops", BENCH_OPS))
+    assert json_file.exists() == bool(options.get("json_file"))
+
+
+@pytest.fixture(params=["-", "t.json"])
+def data_save_timings(request):
+    return request.param
+
+
+def test_save_timings(monkeypatch, tmp_path, data_save_timings):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(OPTS, "timings", data_save_timings)
+    STATS.reset()
+    STATS.add_latency(0.25)
+    with STATS.stage("decode"):
+        pass
+    STATS.merge(STATS.pop())
+    Main.save_timings(1.5)
+    if data_save_timings == "-":
+        assert not list(tmp_path.iterdir())
+    else:
+        data = json.loads((tmp_path / "t.json").read_text())
+        assert data["elapsed_s"] == 1.5
+        assert data["tasks"]["p50_ms"] == 250.0
+        assert data["stages"]["Stage decode"]["count"] == 1
+    STATS.reset()
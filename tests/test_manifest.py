@@ -0,0 +1,124 @@
+"""Test manifest.py
+pytest -sv tests/test_manifest.py
+Copyright © 2025 John Liu
+"""
+
+import os
+import shutil
+from os.path import dirname
+from pathlib import Path
+
+import pytest
+
+from batch_img.const import MANIFEST
+from batch_img.manifest import Manifest
+
+_dir = dirname(__file__)
+
+
+def op_one(task: tuple) -> tuple:
+    return True, task
+
+
+def op_two(task: tuple) -> tuple:
+    return True, task
+
+
+@pytest.fixture(
+    params=[
+        (
+            op_one,
+            (Path("a.jpg"), "replace", 800),
+            op_one,
+            (Path("b.jpg"), "replace", 800),
+            True,
+        ),
+        (
+            op_one,
+            (Path("a.jpg"), "replace", 800),
+            op_one,
+            (Path("a.jpg"), "replace", 640),
+            False,
+        ),
+        (
+            op_one,
+            (Path("a.jpg"), "replace", 800),
+            op_two,
+            (Path("a.jpg"), "replace", 800),
+            False,
+        ),
+        (
+            op_one,
+            (Path("a.jpg"), "replace"),
+            op_one,
+            (Path("a.jpg"), Path("out")),
+            False,
+        ),
+    ]
+)
+def data_op_key(request):
+    return request.param
+
+
+def test_op_key(data_op_key):
+    func1, task1, func2, task2, expected = data_op_key
+    actual = Manifest.op_key(func1, task1) == Manifest.op_key(func2, task2)
+    assert actual == expected
+
+
+@pytest.fixture()
+def image_file(tmp_path):
+    file = tmp_path / "roof.jpg"
+    shutil.copy(f"{_dir}/data/JPG/roof.jpg", file)
+    return file
+
+
+def test_pending(image_file):
+    tasks = [(image_file, "replace", 800)]
+    manifest = Manifest()
+    assert list(manifest.pending(op_one, tasks)) == tasks
+    manifest.record(op_one, tasks[0])
+    manifest.save()
+    assert (image_file.parent / MANIFEST).exists()
+
+    manifest = Manifest()
+    assert not list(manifest.pending(op_one, tasks))
+    assert manifest.skipped == 1
+    # other params or other operation
+    assert list(manifest.pending(op_one, [(image_file, "replace", 640)]))
+    assert list(manifest.pending(op_two, tasks)) == tasks
+
+
+@pytest.fixture(params=[(False, True), (True, False)])
+def data_touched(request):
+    return request.param
+
+
+def test_pending_touched(image_file, data_touched):
+    content_hash, expected = data_touched
+    tasks = [(image_file, "replace", 800)]
+    manifest = Manifest(content_hash)
+    manifest.record(op_one, tasks[0])
+    st = os.stat(image_file)
+    os.utime(image_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    actual = bool(list(manifest.pending(op_one, tasks)))
+    assert actual == expected
+
+
+def test_pending_changed(image_file):
+    tasks = [(image_file, "replace", 800)]
+    manifest = Manifest(True)
+    manifest.record(op_one, tasks[0])
+    with open(image_file, "ab") as f:
+        f.write(b"\0")
+    assert list(manifest.pending(op_one, tasks)) == tasks
+
+
+def test_bad_manifest(image_file):
+    (image_file.parent / MANIFEST).write_text("{bad json", encoding="utf-8")
+    tasks = [(image_file, "replace", 800)]
+    manifest = Manifest()
+    assert list(manifest.pending(op_one, tasks)) == tasks
+    manifest.record(op_one, tasks[0])
+    manifest.save()
+    assert not list(Manifest().pending(op_one, tasks))
@@ -7,8 +7,11 @@ from os.path import dirname
 from pathlib import Path
 from unittest.mock import patch
 
+import piexif
 import pytest
+from PIL import Image
 
+from batch_img.const import EXIF, REPLACE
 from batch_img.no_gps import NoGps
 
 _dir = dirname(__file__)
@@ -68,3 +71,84 @@ def test_remove_all_images_gps(data_remove_all_images_gps):
     in_path, out_path, expected = data_remove_all_images_gps
     actual = NoGps.remove_all_images_gps(in_path, out_path)
     assert actual == expected
+
+
+GPS = {
+    piexif.GPSIFD.GPSLatitudeRef: b"N",
+    piexif.GPSIFD.GPSLatitude: ((37, 1), (46, 1), (3000, 100)),
+    piexif.GPSIFD.GPSLongitudeRef: b"W",
+    piexif.GPSIFD.GPSLongitude: ((122, 1), (25, 1), (1000, 100)),
+}
+
+
+@pytest.fixture(
+    params=[
+        (f"{_dir}/data/JPG/IMG_0131.jpg", "JPEG", "a.jpg"),
+        (f"{_dir}/data/PNG/Checkmark.PNG", "PNG", "b.png"),
+        (f"{_dir}/data/HEIC/IMG_0070.HEIC", "HEIF", "c.heic"),
+    ]
+)
+def gps_file(request, tmp_path):
+    """Image file with GPS in EXIF"""
+    src, img_format, name = request.param
+    file = tmp_path / name
+    with Image.open(src) as img:
+        exif_dict = piexif.load(img.info[EXIF])
+        exif_dict["GPS"] = GPS
+        exif_dict.pop("thumbnail", None)
+        img.save(file, img_format, exif=piexif.dump(exif_dict))
+    return file
+
+
+def test_remove_1_image_gps_lossless(gps_file):
+    data = gps_file.read_bytes()
+    ok, file = NoGps.remove_1_image_gps((gps_file, REPLACE))
+    assert (ok, file) == (True, gps_file)
+    new_data = file.read_bytes()
+    # only the GPS bytes in EXIF changed
+    assert len(new_data) == len(data)
+    assert sum(a != b for a, b in zip(data, new_data, strict=True)) < 64
+    with Image.open(file) as img:
+        assert not piexif.load(img.info[EXIF]).get("GPS")
+        img.load()
+
+
+@patch("batch_img.no_gps.NoGps.splice_exif")
+def test_remove_1_image_gps_fallback(mock_splice_exif, gps_file, tmp_path):
+    mock_splice_exif.return_value = None
+    ok, file = NoGps.remove_1_image_gps((gps_file, tmp_path / "out"))
+    assert ok is True
+    assert file.name == f"{gps_file.stem}_NoGPS{gps_file.suffix}"
+    with Image.open(file) as img:
+        assert not piexif.load(img.info[EXIF]).get("GPS")
+
+
+@pytest.fixture(
+    params=[
+        (
+            b"..II*\x00abcd..",
+            b"II*\x00abcd",
+            b"II*\x00wxyz",
+            "JPEG",
+            b"..II*\x00wxyz..",
+        ),
+        (
+            b"..II*\x00abcd..",
+            b"Exif\x00\x00II*\x00abcd",
+            b"Exif\x00\x00II*\x00wxyz",
+            "HEIF",
+            b"..II*\x00wxyz..",
+        ),
+        (b"II*\x00abII*\x00ab", b"II*\x00ab", b"II*\x00xy", "JPEG", None),
+        (b"..II*\x00abcd..", b"II*\x00abcd", b"II*\x00wx", "JPEG", None),
+        (b"..II*\x00abcd..", b"II*\x00abcd", b"II*\x00wxyz", "PNG", None),
+        (b"....", b"II*\x00abcd", b"II*\x00wxyz", "JPEG", None),
+    ]
+)
+def data_splice_exif(request):
+    return request.param
+
+
+def test_splice_exif(data_splice_exif):
+    data, old, new, img_format, expected = data_splice_exif
+    assert NoGps.splice_exif(data, old, new, img_format) == expected
@@ -0,0 +1,30 @@
+"""Test opts.py
+pytest -sv tests/test_opts.py
+Copyright © 2025 John Liu
+"""
+
+import pytest
+
+from batch_img.opts import Opts
+
+
+@pytest.fixture(
+    params=[
+        (
+            {"executor": "process", "src_path": "src/file"},
+            {"executor": "process", "window": 0},
+        ),
+        ({"executor": None, "window": 8}, {"executor": "auto", "window": 8}),
+        ({}, {"executor": "auto", "window": 0}),
+    ]
+)
+def data_load(request):
+    return request.param
+
+
+def test_load(data_load):
+    options, expected = data_load
+    opts = Opts(executor="thread")
+    opts.load(options)
+    actual = opts.to_dict()
+    assert {k: actual[k] for k in expected} == expected
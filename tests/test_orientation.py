@@ -3,13 +3,18 @@ pytest -sv tests/test_orientation.py
 Copyright © 2025 John Liu
 """
 
+from concurrent.futures import ThreadPoolExecutor
 from os.path import dirname
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
+import numpy as np
+import piexif
 import pytest
+from PIL import Image
 
 from batch_img.orientation import EXIF_CW_ANGLE, Orientation
+from batch_img.stats import STATS
 
 _dir = dirname(__file__)
 
@@ -56,6 +61,29 @@ def test_set_exif_orientation(data_set_exif_orientation):
     assert actual == expected
 
 
+@pytest.fixture(
+    params=[
+        Path(f"{_dir}/data/HEIC/IMG_0131.HEIC"),
+        Path(f"{_dir}/data/JPG/152.JPG"),
+        Path(f"{_dir}/data/PNG/Checkmark.PNG"),
+    ]
+)
+def data_get_floor_scores(request):
+    return request.param
+
+
+def test_get_floor_scores(data_get_floor_scores):
+    with Image.open(data_get_floor_scores) as img:
+        img.thumbnail((301, 301))  # odd sizes for the 1/3 strips
+        opencv_img = np.array(img.convert("RGB"))
+    actual = Orientation.get_floor_scores(opencv_img)
+    # The same as the scores of the 4 rotated copies, but Canny tie-breaks
+    for angle_cw in (0, 90, 180, 270):
+        rotated = Orientation._rotate_image(opencv_img, angle_cw)
+        expected = Orientation.get_floor_score(rotated)
+        assert abs(actual[angle_cw] - expected) <= 0.005
+
+
 @pytest.fixture(
     params=[
         (Path(f"{_dir}/data/HEIC/IMG_0131.HEIC"), 270),
@@ -100,6 +128,128 @@ def test_get_cw_angle_by_face(data_detect_by_face):
     assert actual == expected
 
 
+def test_get_face_cascade():
+    cascade = Orientation.get_face_cascade()
+    assert Orientation.get_face_cascade() is cascade
+    with ThreadPoolExecutor(1) as executor:
+        other = executor.submit(Orientation.get_face_cascade).result()
+    assert other is not cascade
+    assert not other.empty()
+
+
+@pytest.fixture(
+    params=[
+        (1, [0, 90, 180, 270]),
+        (6, [90, 0, 180, 270]),
+        (8, [270, 0, 90, 180]),
+    ]
+)
+def data_face_order(request):
+    return request.param
+
+
+@patch("batch_img.orientation.Orientation.get_face_cascade")
+def test_get_cw_angle_by_face_order(mock_cascade, data_face_order, tmp_path):
+    o_val, expected = data_face_order
+    mock_cascade.return_value = MagicMock(**{"detectMultiScale.return_value": []})
+    file = tmp_path / "small.jpg"
+    exif_bytes = piexif.dump({"0th": {piexif.ImageIFD.Orientation: o_val}})
+    Image.new("RGB", (60, 40)).save(file, exif=exif_bytes)
+    with patch(
+        "batch_img.orientation.Orientation._rotate_image",
+        wraps=Orientation._rotate_image,
+    ) as mock_rotate:
+        assert Orientation.get_cw_angle_by_face(file) == -1
+    # Smaller than the working size: one pass of the 4 angles
+    assert [c.args[1] for c in mock_rotate.call_args_list] == expected
+
+
+def test_get_cw_angle_by_face_time_budget():
+    file = Path(f"{_dir}/data/HEIC/chef2_90cw.heic")
+    assert Orientation.get_cw_angle_by_face(file, time_budget=0) == -1
+
+
+def floor_image(size: tuple) -> Image.Image:
+    """Dark top to bright bottom, i.e. upright by the floor edge"""
+    column = np.linspace(0, 255, size[1], dtype=np.uint8)
+    return Image.fromarray(np.repeat(column[:, None], size[0], axis=1)).convert("RGB")
+
+
+@pytest.fixture(
+    params=[
+        ("JPEG", 6, None, (90, "exif"), ["exif"]),
+        ("JPEG", 8, (160, 107), (270, "exif"), ["exif"]),
+        ("JPEG", 1, (160, 107), (0, "thumbnail"), ["exif", "thumbnail"]),
+        ("JPEG", 1, (107, 160), (0, "reduced"), ["exif", "thumbnail", "reduced"]),
+        ("JPEG", 1, None, (0, "reduced"), ["exif", "thumbnail", "reduced"]),
+        ("HEIF", 1, 256, (0, "thumbnail"), ["exif", "thumbnail"]),
+    ]
+)
+def data_resolve_cw_angle(request):
+    return request.param
+
+
+def test_resolve_cw_angle(tmp_path, data_resolve_cw_angle):
+    i_format, o_val, thumb, expected, tiers = data_resolve_cw_angle
+    file = tmp_path / f"floor.{i_format.lower()}"
+    exif_dict = {"0th": {piexif.ImageIFD.Orientation: o_val}}
+    params = {}
+    if i_format == "HEIF":
+        params["thumbnails"] = [thumb]
+    elif thumb:
+        # EXIF thumbnail, stale if its aspect differs from the image
+        buf = tmp_path / "thumb.jpg"
+        floor_image(thumb).save(buf)
+        exif_dict["1st"] = {}
+        exif_dict["thumbnail"] = buf.read_bytes()
+    img = floor_image((600, 400))
+    img.save(file, i_format, exif=piexif.dump(exif_dict), **params)
+    STATS.pop()
+    assert Orientation.resolve_cw_angle(file) == expected
+    actual = STATS.pop()
+    assert [name.split()[-1] for name in actual] == tiers
+    assert [hits for _, hits, _ in actual.values()] == [0] * (len(tiers) - 1) + [1]
+
+
+@pytest.fixture(
+    params=[
+        (6, None, (90, "exif"), ["exif"]),
+        (1, None, (0, "reduced"), ["exif", "thumbnail", "reduced"]),
+        (
+            1,
+            Image.Transpose.ROTATE_90,
+            (90, "reduced"),
+            ["exif", "thumbnail", "reduced"],
+        ),
+        (
+            1,
+            Image.Transpose.ROTATE_180,
+            (180, "reduced"),
+            ["exif", "thumbnail", "reduced"],
+        ),
+    ]
+)
+def data_resolve_img_cw_angle(request):
+    return request.param
+
+
+def test_resolve_img_cw_angle(data_resolve_img_cw_angle):
+    o_val, transpose, expected, tiers = data_resolve_img_cw_angle
+    img = floor_image((600, 400))
+    if transpose:
+        img = img.transpose(transpose)
+    STATS.pop()
+    assert Orientation.resolve_img_cw_angle(img, o_val) == expected
+    assert [name.split()[-1] for name in STATS.pop()] == tiers
+
+
+def test_resolve_cw_angle_none():
+    file = Path(f"{_dir}/data/PNG/LagrangePoints.png")
+    assert Orientation.resolve_cw_angle(file) == (-1, "")
+    tiers = [name.split()[-1] for name in STATS.pop()]
+    assert tiers == ["exif", "thumbnail", "reduced", "full", "face"]
+
+
 @pytest.fixture(
     params=[
         (Path(f"{_dir}/data/HEIC/chef_180cw.heic"), 180),
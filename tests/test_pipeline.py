@@ -0,0 +1,174 @@
+"""Test pipeline.py
+pytest -sv tests/test_pipeline.py
+Copyright © 2025 John Liu
+"""
+
+import shutil
+from os.path import dirname
+from pathlib import Path
+
+import piexif
+import pytest
+from PIL import Image
+
+from batch_img.border import Border
+from batch_img.common import Common
+from batch_img.const import EXIF, REPLACE
+from batch_img.pipeline import Pipeline
+from batch_img.resize import Resize
+from batch_img.rotate import Rotate
+
+_dir = dirname(__file__)
+
+
+@pytest.fixture(
+    params=[
+        ("resize:1024", ("resize", (1024,))),
+        ("rotate:90", ("rotate", (90,))),
+        ("border:5", ("border", (5, "black"))),
+        ("border: 9, #AABBCC", ("border", (9, "#AABBCC"))),
+        ("remove-gps", ("remove-gps", ())),
+        ("auto-rotate", ("auto-rotate", ())),
+        ("transparent:127", ("transparent", (127, False, 0))),
+        ("transparent:0,white", ("transparent", (0, True, 0))),
+        ("transparent:9,w,16", ("transparent", (9, True, 16))),
+        ("do-effect:hdr", ("do-effect", ("hdr",))),
+    ]
+)
+def data_parse_step(request):
+    return request.param
+
+
+def test_parse_step(data_parse_step):
+    text, expected = data_parse_step
+    assert Pipeline.parse_step(text) == expected
+
+
+@pytest.fixture(
+    params=[
+        [],
+        ["resize"],
+        ["resize:x"],
+        ["resize:800", "rotate:45"],
+        ["border:0"],
+        ["remove-gps:1"],
+        ["auto-rotate:90"],
+        ["transparent:300"],
+        ["transparent:9,black"],
+        ["transparent:9,w,256"],
+        ["do-effect:sepia"],
+        ["bogus:1"],
+    ]
+)
+def data_error_parse_steps(request):
+    return request.param
+
+
+def test_error_parse_steps(data_error_parse_steps):
+    ok, msg = Pipeline.parse_steps(data_error_parse_steps)
+    assert ok is False
+    assert "Use resize:LENGTH" in msg
+
+
+@pytest.fixture(
+    params=[
+        (
+            Path(f"{_dir}/data/HEIC/IMG_0070.HEIC"),
+            ["resize:640", "rotate:90", "border:5", "remove-gps"],
+            "IMG_0070_640_90cw_bw5_NoGPS.HEIC",
+        ),
+        (
+            Path(f"{_dir}/data/JPG/roof.jpg"),
+            ["transparent:200,w", "resize:320"],
+            "roof_a200w_320.png",
+        ),
+        (
+            Path(f"{_dir}/data/JPG/roof.jpg"),
+            ["transparent:200,w,8"],
+            "roof_a200w8.png",
+        ),
+        (
+            Path(f"{_dir}/data/PNG/LagrangePoints.png"),
+            ["do-effect:blur"],
+            "LagrangePoints_blur.png",
+        ),
+        (
+            Path(f"{_dir}/data/HEIC/IMG_0131.HEIC"),
+            ["resize:1920", "auto-rotate", "border:5"],
+            "IMG_0131_1920_270cw_bw5.HEIC",
+        ),
+    ]
+)
+def data_run_1_image(request):
+    return request.param
+
+
+def test_run_1_image(tmp_path, data_run_1_image):
+    in_path, texts, expected = data_run_1_image
+    _, steps = Pipeline.parse_steps(texts)
+    ok, file = Pipeline.run_1_image((in_path, tmp_path, steps))
+    assert ok is True
+    assert file == tmp_path / expected
+    with Image.open(file) as img:
+        if EXIF in img.info:
+            exif_dict = piexif.load(img.info[EXIF])
+            assert not exif_dict.get("GPS")
+
+
+@pytest.fixture(
+    params=[
+        (("resize", (800,)), "800"),
+        (("rotate", (90,)), "90cw"),
+        (("auto-rotate", ()), ""),
+        (("auto-rotate", (0,)), ""),
+        (("auto-rotate", (270,)), "270cw"),
+        (("border", (5, "black")), "bw5"),
+        (("remove-gps", ()), "NoGPS"),
+        (("transparent", (127, True, 8)), "a127w8"),
+        (("do-effect", ("hdr",)), "hdr"),
+    ]
+)
+def data_get_extra(request):
+    return request.param
+
+
+def test_get_extra(data_get_extra):
+    step, expected = data_get_extra
+    assert Pipeline.get_extra(*step) == expected
+
+
+def test_run_1_image_same_as_chain(tmp_path):
+    in_path = Path(f"{_dir}/data/PNG/LagrangePoints.png")
+    _, steps = Pipeline.parse_steps(["resize:300", "rotate:270", "border:4,red"])
+    ok, file = Pipeline.run_1_image((in_path, tmp_path, steps))
+    assert ok is True
+    # Lossless PNG: the same pixels as the chained sub-commands
+    _, f1 = Resize.resize_an_image((in_path, tmp_path, 300))
+    _, f2 = Rotate.rotate_1_image((f1, tmp_path, 270))
+    _, f3 = Border.border_1_image((f2, tmp_path, 4, "red"))
+    assert Common.are_images_equal(file, f3)
+
+
+def test_run_1_image_replace(tmp_path):
+    in_path = tmp_path / "roof.jpg"
+    shutil.copy(f"{_dir}/data/JPG/roof.jpg", in_path)
+    _, steps = Pipeline.parse_steps(["resize:200", "rotate:180"])
+    assert Pipeline.run_1_image((in_path, REPLACE, steps)) == (True, in_path)
+    assert sorted(tmp_path.iterdir()) == [in_path]
+    with Image.open(in_path) as img:
+        assert max(img.size) == 200
+
+
+def test_error_run_1_image():
+    ok, msg = Pipeline.run_1_image((Path("img/file"), REPLACE, []))
+    assert ok is False
+    assert str(Path("img/file")) in msg
+
+
+def test_run_all_in_dir(tmp_path):
+    _, steps = Pipeline.parse_steps(["resize:320", "border:2"])
+    out_path = tmp_path / "out"
+    assert Pipeline.run_all_in_dir(Path(f"{_dir}/data/PNG"), out_path, steps)
+    actual = sorted(f.name for f in out_path.iterdir())
+    assert actual == ["Checkmark_320_bw2.PNG", "LagrangePoints_320_bw2.png"]
+    assert not Pipeline.run_all_in_dir(tmp_path / "empty", out_path, steps)
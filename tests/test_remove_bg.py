@@ -3,17 +3,55 @@ pytest -sv tests/test_remove_bg.py
 Copyright © 2025 John Liu
 """
 
+import os
 from os.path import dirname
 from pathlib import Path
 from unittest.mock import patch
 
 import pytest
 
+from batch_img import remove_bg
+from batch_img.opts import OPTS
 from batch_img.remove_bg import RemoveBg
 
 _dir = dirname(__file__)
 
 
+@pytest.fixture
+def sessions(monkeypatch):
+    monkeypatch.setattr(remove_bg, "SESSIONS", {})
+    monkeypatch.delenv("U2NET_HOME", raising=False)
+    with patch("batch_img.remove_bg.new_session") as mock_new_session:
+        mock_new_session.side_effect = lambda model: f"session-{model}"
+        yield mock_new_session
+
+
+def test_get_session(sessions):
+    assert RemoveBg.get_session("u2net") == "session-u2net"
+    assert RemoveBg.get_session("u2net") == "session-u2net"
+    assert RemoveBg.get_session("u2netp") == "session-u2netp"
+    assert sessions.call_count == 2
+
+
+def test_get_session_model_dir(sessions, tmp_path):
+    assert RemoveBg.get_session("silueta", str(tmp_path)) == "session-silueta"
+    assert os.environ["U2NET_HOME"] == str(tmp_path)
+
+
+@patch("batch_img.remove_bg.remove")
+def test_remove_bg_image_reuse_session(mock_remove, sessions, monkeypatch, tmp_path):
+    monkeypatch.setattr(OPTS, "model", "u2netp")
+    mock_remove.side_effect = lambda img, session: img
+    in_path = Path(f"{_dir}/data/PNG/Checkmark.PNG")
+    for _ in range(3):
+        ok, _ = RemoveBg.remove_bg_image((in_path, tmp_path))
+        assert ok is True
+    sessions.assert_called_once_with("u2netp")
+    assert {c.kwargs["session"] for c in mock_remove.call_args_list} == {
+        "session-u2netp"
+    }
+
+
 @pytest.fixture(
     params=[
         (
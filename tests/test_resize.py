@@ -3,13 +3,19 @@ pytest -sv tests/test_resize.py
 Copyright © 2025 John Liu
 """
 
+import os
+import shutil
 from os.path import dirname
 from pathlib import Path
+from time import perf_counter
 from unittest.mock import patch
 
+import numpy as np
 import pytest
+from PIL import Image
 
-from batch_img.const import REPLACE
+from batch_img.const import MANIFEST, REPLACE
+from batch_img.opts import OPTS
 from batch_img.resize import Resize
 
 _dir = dirname(__file__)
@@ -79,3 +85,86 @@ def test_resize_all_progress_bar(data_resize_all_progress_bar):
     in_path, out_path, length, expected = data_resize_all_progress_bar
     actual = Resize.resize_all_progress_bar(in_path, out_path, length)
     assert actual == expected
+
+
+def test_resize_all_recursive(monkeypatch, tmp_path):
+    monkeypatch.setattr(OPTS, "recursive", True)
+    in_path = tmp_path / "in"
+    shutil.copytree(f"{_dir}/data/PNG", in_path / "sub" / "PNG")
+    shutil.copy(f"{_dir}/data/JPG/roof.jpg", in_path)
+    out_path = tmp_path / "out"
+    assert Resize.resize_all_progress_bar(in_path, out_path, 320)
+    actual = sorted(str(f.relative_to(out_path)) for f in out_path.rglob("*.*"))
+    assert actual == [
+        "roof_320.jpg",
+        "sub/PNG/Checkmark_320.PNG",
+        "sub/PNG/LagrangePoints_320.png",
+    ]
+
+
+def test_resize_all_incremental(monkeypatch, tmp_path):
+    monkeypatch.setattr(OPTS, "incremental", True)
+    monkeypatch.setattr(OPTS, "executor", "thread")
+    in_path = tmp_path / "in"
+    shutil.copytree(f"{_dir}/data/PNG", in_path)
+    out_path = tmp_path / "out"
+    assert Resize.resize_all_progress_bar(in_path, out_path, 320)
+    outs = sorted(out_path.glob("*.*"))
+    assert len(outs) == 2
+    with patch("batch_img.resize.Image.open", wraps=Image.open) as mock_open:
+        assert Resize.resize_all_progress_bar(in_path, out_path, 320)
+        assert mock_open.call_count == 0
+        assert Resize.resize_all_progress_bar(in_path, out_path, 300)
+        assert mock_open.call_count == 2
+    # Without the manifest, process again, but not rewrite the same bytes
+    (in_path / MANIFEST).unlink()
+    for f in outs:
+        os.utime(f, ns=(0, 0))
+    assert Resize.resize_all_progress_bar(in_path, out_path, 320)
+    assert [f.stat().st_mtime_ns for f in outs] == [0, 0]
+
+
+def psnr(img1: Image.Image, img2: Image.Image) -> float:
+    """Peak signal-to-noise ratio in dB of two same size images"""
+    diff = np.asarray(img1, dtype=np.float64) - np.asarray(img2, dtype=np.float64)
+    mse = np.mean(diff**2)
+    return 99.0 if mse == 0 else float(10 * np.log10(255**2 / mse))
+
+
+@pytest.fixture(scope="module")
+def big_jpeg(tmp_path_factory):
+    """6000x4000 JPEG like a 24 MP camera photo"""
+    file = tmp_path_factory.mktemp("big") / "big.jpg"
+    with Image.open(f"{_dir}/data/JPG/IMG_0131.jpg") as img:
+        img.resize((6000, 4000), Image.Resampling.BICUBIC).save(file, quality=92)
+    return file
+
+
+@pytest.fixture(
+    params=[
+        ("big", 1920, (3000, 2000)),
+        ("big", 640, (1500, 1000)),
+        (f"{_dir}/data/JPG/IMG_0131.jpg", 480, (720, 960)),
+        (f"{_dir}/data/JPG/roof.jpg", 1920, (960, 1280)),
+    ]
+)
+def data_resize_img_draft(request, big_jpeg):
+    file, length, decoded = request.param
+    return (big_jpeg if file == "big" else Path(file)), length, decoded
+
+
+def test_resize_img_draft(data_resize_img_draft):
+    file, length, decoded = data_resize_img_draft
+    start = perf_counter()
+    with Image.open(file) as img:
+        img.load()  # full decode, no draft
+        expected = Resize.resize_img(img, length)
+    full_sec = perf_counter() - start
+    start = perf_counter()
+    with Image.open(file) as img:
+        actual = Resize.resize_img(img, length)
+        assert img.size == decoded
+    draft_sec = perf_counter() - start
+    print(f"{file.name} {length}: {full_sec=:.3f}, {draft_sec=:.3f}")
+    assert actual.size == expected.size
+    assert psnr(actual, expected) > 44
@@ -3,13 +3,18 @@ pytest -sv tests/test_rotate.py
 Copyright © 2025 John Liu
 """
 
+import shutil
 from os.path import dirname
 from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
+import piexif
 import pytest
+from PIL import Image
 
-from batch_img.const import REPLACE
+from batch_img.const import EXIF, REPLACE
+from batch_img.opts import OPTS
 from batch_img.rotate import Rotate
 
 _dir = dirname(__file__)
@@ -104,3 +109,100 @@ def test_rotate_all_in_dir(data_rotate_all_in_dir):
     in_path, out_path, angle_cw, expected = data_rotate_all_in_dir
     actual = Rotate.rotate_all_in_dir(in_path, out_path, angle_cw)
     assert actual == expected
+
+
+@pytest.fixture(
+    params=[
+        (f"{_dir}/data/JPG/roof.jpg", 90, True),
+        (f"{_dir}/data/JPG/roof.jpg", 180, True),
+        (f"{_dir}/data/JPG/152.JPG", 90, False),
+        (f"{_dir}/data/JPG/152.JPG", 180, False),
+        (f"{_dir}/data/JPG/152.JPG", 270, True),
+    ]
+)
+def data_is_mcu_aligned(request):
+    return request.param
+
+
+def test_is_mcu_aligned(data_is_mcu_aligned):
+    file, angle_cw, expected = data_is_mcu_aligned
+    with Image.open(file) as img:
+        assert Rotate.is_mcu_aligned(img, angle_cw) == expected
+
+
+@pytest.fixture()
+def fake_jpegtran(monkeypatch, tmp_path):
+    """Fake jpegtran: log the args, copy the input file to the output file"""
+    script = tmp_path / "jpegtran"
+    log_file = tmp_path / "jpegtran.log"
+    script.write_text(
+        "#!/bin/sh\n"
+        f'echo "$@" >> {log_file}\n'
+        'while [ "$1" != "-outfile" ]; do shift; done\n'
+        'cp "$3" "$2"\n',
+        encoding="utf-8",
+    )
+    script.chmod(0o755)
+    monkeypatch.setattr("batch_img.rotate.JPEGTRAN", str(script))
+    return log_file
+
+
+@pytest.fixture(
+    params=[
+        ("roof.jpg", 90, "perfect", "-rotate 90 -perfect"),
+        ("152.JPG", 270, "perfect", "-rotate 270 -perfect"),
+        ("152.JPG", 90, "trim", "-rotate 90 -trim"),
+        ("152.JPG", 90, "perfect", None),
+        ("roof.jpg", 90, "off", None),
+    ]
+)
+def data_rotate_jpeg_lossless(request):
+    return request.param
+
+
+def test_rotate_jpeg_lossless(
+    monkeypatch, tmp_path, fake_jpegtran, data_rotate_jpeg_lossless
+):
+    name, angle_cw, mode, expected = data_rotate_jpeg_lossless
+    monkeypatch.setattr(OPTS, "jpeg_lossless", mode)
+    in_path = Path(f"{_dir}/data/JPG/{name}")
+    out_path = tmp_path / "out"
+    ok, file = Rotate.rotate_1_image((in_path, out_path, angle_cw))
+    assert ok is True
+    assert file == out_path / f"{in_path.stem}_{angle_cw}cw{in_path.suffix}"
+    assert sorted(out_path.iterdir()) == [file]
+    with Image.open(file) as img, Image.open(in_path) as src:
+        exif_dict = piexif.load(img.info[EXIF])
+        assert exif_dict["0th"][piexif.ImageIFD.Orientation] == 1
+        # the fake jpegtran does not rotate
+        expected_size = src.size if expected else src.size[::-1]
+        assert img.size == expected_size
+    if expected:
+        assert expected in fake_jpegtran.read_text(encoding="utf-8")
+    else:
+        assert not fake_jpegtran.exists()
+
+
+def test_rotate_jpeg_lossless_fallback(monkeypatch, tmp_path):
+    script = tmp_path / "jpegtran"
+    script.write_text("#!/bin/sh\nexit 1\n", encoding="utf-8")
+    script.chmod(0o755)
+    monkeypatch.setattr("batch_img.rotate.JPEGTRAN", str(script))
+    in_path = tmp_path / "roof.jpg"
+    shutil.copy(f"{_dir}/data/JPG/roof.jpg", in_path)
+    assert Rotate.rotate_1_image((in_path, REPLACE, 90)) == (True, in_path)
+    assert sorted(tmp_path.iterdir()) == [script, in_path]
+    with Image.open(in_path) as img:
+        assert img.size == (1280, 960)
+
+
+@pytest.mark.skipif(not shutil.which("jpegtran"), reason="need jpegtran")
+def test_rotate_jpeg_lossless_jpegtran(tmp_path):
+    in_path = Path(f"{_dir}/data/JPG/roof.jpg")
+    ok, file = Rotate.rotate_1_image((in_path, tmp_path, 90))
+    assert ok is True
+    with Image.open(file) as img, Image.open(in_path) as src:
+        expected = src.transpose(Image.ROTATE_270)
+        diff = np.asarray(img, dtype=np.float64) - np.asarray(expected, np.float64)
+        assert img.size == expected.size
+        assert np.abs(diff).mean() < 2
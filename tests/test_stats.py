@@ -0,0 +1,173 @@
+"""Test stats.py
+pytest -sv tests/test_stats.py
+Copyright © 2025 John Liu
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batch_img.opts import OPTS
+from batch_img.stats import HIST_BUCKETS, Stats
+
+
+def test_add_pop():
+    stats = Stats()
+    stats.add("a", 0.5)
+    stats.add("a", 1.5, hit=False)
+    stats.add("b", 0.25)
+    assert stats.pop() == {"a": (2, 1, 2.0), "b": (1, 1, 0.25)}
+    assert not stats.pop()
+
+
+def test_pop_per_thread():
+    stats = Stats()
+    stats.add("main", 1.0)
+
+    def run_task(seconds: float) -> dict:
+        stats.add("task", seconds)
+        return stats.pop()
+
+    with ThreadPoolExecutor(2) as executor:
+        actual = list(executor.map(run_task, (0.5, 0.25)))
+    assert actual == [{"task": (1, 1, 0.5)}, {"task": (1, 1, 0.25)}]
+    assert stats.pop() == {"main": (1, 1, 1.0)}
+
+
+@pytest.fixture(
+    params=[
+        ([], []),
+        (
+            [{"b": (1, 0, 0.5)}, {"a": (2, 1, 0.5)}, {"a": (2, 2, 1.5)}],
+            [
+                "a: hit 3/4 (75%), avg 500.0 ms, total 2.00s",
+                "b: hit 0/1 (0%), avg 500.0 ms, total 0.50s",
+            ],
+        ),
+    ]
+)
+def data_merge_report(request):
+    return request.param
+
+
+def test_merge_report(data_merge_report):
+    pendings, expected = data_merge_report
+    stats = Stats()
+    for pending in pendings:
+        stats.merge(pending)
+    assert stats.report() == expected
+
+
+def test_add_latency():
+    stats = Stats()
+    with ThreadPoolExecutor(2) as executor:
+        list(executor.map(stats.add_latency, (0.5, 0.25)))
+    assert sorted(stats.latencies) == [0.25, 0.5]
+
+
+def test_reset():
+    stats = Stats()
+    stats.merge({"a": (1, 1, 1.0)})
+    stats.add("b", 1.0)
+    stats.add_latency(1.0)
+    stats.reset()
+    assert not stats.report()
+    assert not stats.pop()
+    assert not stats.latencies
+
+
+@pytest.fixture(params=[("", {}), ("-", {"Stage a": 1}), ("t.json", {"Stage a": 1})])
+def data_stage(request):
+    return request.param
+
+
+def test_stage(monkeypatch, data_stage):
+    timings, expected = data_stage
+    monkeypatch.setattr(OPTS, "timings", timings)
+    stats = Stats()
+    with stats.stage("a"):
+        pass
+    assert {name: vals[0] for name, vals in stats.pop().items()} == expected
+
+
+@pytest.fixture(
+    params=[
+        ([0.0002], {0: 1}),
+        ([0.0015, 0.003, 0.003], {1: 1, 2: 2}),
+        ([0.5, 999.0], {9: 1, HIST_BUCKETS - 1: 1}),
+    ]
+)
+def data_add_stage(request):
+    return request.param
+
+
+def test_add_stage(data_add_stage):
+    seconds, buckets = data_add_stage
+    stats = Stats()
+    for val in seconds:
+        stats.add_stage("s", val)
+    tried, hits, total, *hist = stats.pop()["s"]
+    assert (tried, hits) == (len(seconds), len(seconds))
+    assert total == pytest.approx(sum(seconds))
+    assert {i: n for i, n in enumerate(hist) if n} == buckets
+
+
+def test_stage_report():
+    stats = Stats()
+    stats.add("Orientation face", 0.5, hit=False)
+    for val in (0.003, 0.003, 0.02):
+        stats.add_stage("Stage decode", val)
+    pending = stats.pop()
+    stats.merge(pending)
+    stats.merge(pending)
+    assert stats.report() == [
+        "Orientation face: hit 0/2 (0%), avg 500.0 ms, total 1.00s",
+        "Stage decode: 6 runs, avg 8.7 ms, total 0.05s, p50 < 4 ms, p95 < 32 ms",
+    ]
+    assert stats.to_dict() == {
+        "Orientation face": {"count": 2, "hits": 0, "seconds": 1.0},
+        "Stage decode": {
+            "count": 6,
+            "hits": 6,
+            "seconds": 0.052,
+            "histogram_ms": {"4": 4, "32": 2},
+        },
+    }
+
+
+@pytest.fixture(
+    params=[
+        ([], {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}),
+        ([0.5], {"count": 1, "p50_ms": 500.0, "p95_ms": 500.0, "max_ms": 500.0}),
+        (
+            [i / 100 for i in range(1, 101)],
+            {"count": 100, "p50_ms": 505.0, "p95_ms": 950.5, "max_ms": 1000.0},
+        ),
+    ]
+)
+def data_get_latency_summary(request):
+    return request.param
+
+
+def test_get_latency_summary(data_get_latency_summary):
+    latencies, expected = data_get_latency_summary
+    stats = Stats()
+    for val in reversed(latencies):
+        stats.add_latency(val)
+    assert stats.get_latency_summary() == expected
+
+
+@pytest.fixture(
+    params=[
+        ([1, 0, 0], 0.5, 1.0),
+        ([0, 3, 1, 0], 0.95, 4.0),
+        ([0, 1, 9], 0.5, float("inf")),
+    ]
+)
+def data_get_percentile_ms(request):
+    return request.param
+
+
+def test_get_percentile_ms(data_get_percentile_ms):
+    hist, fraction, expected = data_get_percentile_ms
+    assert Stats.get_percentile_ms(hist, fraction) == expected
@@ -3,13 +3,18 @@ pytest -sv tests/test_transparent.py
 Copyright © 2025 John Liu
 """
 
+import shutil
+import time
 from os.path import dirname
 from pathlib import Path
 from unittest.mock import patch
 
+import numpy as np
 import pytest
+from PIL import Image
 
 from batch_img.const import REPLACE
+from batch_img.opts import OPTS
 from batch_img.transparent import Transparent
 
 _dir = dirname(__file__)
@@ -100,6 +105,7 @@ def test_do_1_image_transparency(data_1_image_transparency):
         out_path,
         transparency,
         white,
+        0,
     ))
     assert actual == expected
 
@@ -107,7 +113,7 @@ def test_do_1_image_transparency(data_1_image_transparency):
 @pytest.mark.slow(reason="This test modifies test data file.")
 def test_do_1_image_transparency_replace():
     in_path = Path("~/Downloads/Cartoon_1024.heic").expanduser()
-    actual = Transparent.do_1_image_transparency((in_path, REPLACE, 0, False))
+    actual = Transparent.do_1_image_transparency((in_path, REPLACE, 0, False, 0))
     assert actual == (True, in_path)
 
 
@@ -119,11 +125,68 @@ def test_error_do_1_image_transparency(mock_open):
         Path("out/path"),
         33,
         True,
+        0,
     ))
     # For Windows & macOS
     assert str(Path("img/file")) in actual[1]
 
 
+def per_pixel_transparent(img: Image.Image, transparency: int) -> Image.Image:
+    """The former per pixel loops, for reference"""
+    a_img = img.convert("RGBA")
+    pixels = list(zip(*[iter(a_img.tobytes())] * 4, strict=True))
+    new_data = [(r, g, b, transparency) for r, g, b, _ in pixels]
+    a_img.putdata([
+        (r, g, b, 0) if (r, g, b) == (255, 255, 255) else (r, g, b, a)
+        for r, g, b, a in new_data
+    ])
+    return a_img
+
+
+@pytest.fixture(
+    params=[
+        (0, [255, 0, 0, 0]),
+        (5, [255, 255, 0, 0]),
+        (15, [255, 255, 255, 0]),
+        (255, [255, 255, 255, 255]),
+    ]
+)
+def data_white_mask(request):
+    return request.param
+
+
+def test_white_mask(data_white_mask):
+    tolerance, expected = data_white_mask
+    img = Image.new("RGB", (4, 1))
+    img.putdata([(255, 255, 255), (250, 252, 255), (240, 255, 255), (0, 0, 0)])
+    mask = Transparent.white_mask(img, tolerance)
+    assert mask.mode == "L"
+    assert list(mask.tobytes()) == expected
+
+
+def test_set_white_pixel_transparent():
+    img = Image.new("RGBA", (3, 1))
+    img.putdata([(255, 255, 255, 99), (250, 250, 250, 99), (9, 9, 9, 99)])
+    Transparent.set_white_pixel_transparent(img, 5)
+    assert list(img.getchannel("A").tobytes()) == [0, 0, 99]
+
+
+def test_transparent_img_per_mp():
+    """Benchmark vs. the former per pixel loops on a 1 MP near-white image"""
+    rng = np.random.default_rng(0)
+    arr = rng.integers(240, 256, (1000, 1000, 3), dtype=np.uint8)
+    img = Image.fromarray(arr, "RGB")
+    start = time.perf_counter()
+    expected = per_pixel_transparent(img, 99)
+    before = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = Transparent.transparent_img(img, 99, True)
+    after = time.perf_counter() - start
+    print(f"\nPer MP: before {before:.3f}s, after {after:.4f}s")
+    assert actual.tobytes() == expected.tobytes()
+    assert after < before / 10
+
+
 @pytest.fixture(
     params=[
         (
@@ -143,3 +206,16 @@ def test_all_images_transparency(data_all_transparency):
     in_path, out_path, transparency, white, expected = data_all_transparency
     actual = Transparent.all_images_transparency(in_path, out_path, transparency, white)
     assert actual == expected
+
+
+def test_all_images_transparency_by_executor(monkeypatch, tmp_path):
+    in_path = tmp_path / "PNG"
+    shutil.copytree(f"{_dir}/data/PNG", in_path)
+    outputs = {}
+    for executor in ("thread", "process"):
+        monkeypatch.setattr(OPTS, "executor", executor)
+        out_path = tmp_path / executor
+        assert Transparent.all_images_transparency(in_path, out_path, 99, True)
+        outputs[executor] = {f.name: f.read_bytes() for f in out_path.iterdir()}
+    assert len(outputs["process"]) == 2
+    assert outputs["process"] == outputs["thread"]